@@ -3,7 +3,8 @@
 """ A more complex simulation scene, using the damaged_sfp
 environment. It consists of destroyed spent fuel element pools with dislocated
 fuel elements. The robot is equipped with a nuclear radiation sensor, a
-temperature sensor and a laser scanner.
+temperature sensor and a laser scanner. The dose rates measured along the
+robot's path are mapped and published as occupancy grids.
 
 Run with a command line argument "debug" to connect to the PyCharm remote
 debugger (you have to alter the path to the library to match your setup).
@@ -13,6 +14,8 @@ from morse.builder import *
 from morse.builder.robots.morserobots import ATRV
 from nuclear_radiation_sensor.builder.sensors.nuclear_radiation import \
     NuclearRadiation
+from nuclear_radiation_sensor.builder.sensors.radiation_map import \
+    RadiationMap
 from nuclear_radiation_sensor.tools.debughelper import RemoteDebugHelper
 
 import sys
@@ -64,10 +67,20 @@ radiation.add_stream("ros", "nuclear_radiation_sensor.middleware.ros.radiation.R
 radiation.alter("", "nuclear_radiation_sensor.modifiers.gaussian_noise.GaussianNoiseModifier",
                 fields_std_devs=[("dose_rate", 0.05),
                                  ("effective_dose_rate", 0.05)])
+# prune the nuclides of the spent fuel: 1 % error of the emitted dose rate,
+# which may roughly double behind the water and concrete (see NuclearRadiation)
+radiation.properties(nuclide_pruning_error=0.01)
 radiation.translate(x=0.25, z=0.75)
 radiation.frequency(10)
 robot.append(radiation)
 
+# map the measured dose rates
+radiation_map = RadiationMap()
+radiation_map.add_stream("ros", "nuclear_radiation_sensor.middleware.ros.radiation_map.RadiationMapPublisher")
+radiation_map.properties(radiation_sensor="robot.radiation")
+radiation_map.frequency(10)
+robot.append(radiation_map)
+
 
 # set 'fastmode' to True to switch to wireframe mode
 env = Environment('data/environments/damaged_sfp.blend', fastmode=False)
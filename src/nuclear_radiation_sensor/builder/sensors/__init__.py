@@ -1 +1,2 @@
-from nuclear_radiation_sensor.sensors.nuclear_radiation import NuclearRadiation
\ No newline at end of file
+from nuclear_radiation_sensor.sensors.nuclear_radiation import NuclearRadiation
+from nuclear_radiation_sensor.sensors.radiation_map import RadiationMap
\ No newline at end of file
@@ -0,0 +1,7 @@
+from morse.builder.creator import SensorCreator
+
+
+class RadiationMap(SensorCreator):
+    def __init__(self, name=None):
+        SensorCreator.__init__(self, name,
+                               "nuclear_radiation_sensor.sensors.radiation_map.RadiationMap")
@@ -0,0 +1,30 @@
+import roslib
+roslib.load_manifest("nav_msgs")
+
+from nav_msgs.msg import OccupancyGrid
+from morse.middleware.ros import ROSPublisher
+
+
+class RadiationMapPublisher(ROSPublisher):
+    """ ROS publisher for the radiation map, publishing every changed tile of
+        the map as an OccupancyGrid message (nav_msgs/OccupancyGrid.msg), with
+        the dose rate as occupancy.
+    """
+    ros_class = OccupancyGrid
+
+    def default(self, ci):
+        """Publishes an OccupancyGrid message per tile changed since the last
+        publication.
+        """
+        for tile in self.data["tiles"]:
+            msg = OccupancyGrid()
+            msg.header = self.get_ros_header()
+            msg.info.map_load_time = msg.header.stamp
+            msg.info.resolution = tile["resolution"]
+            msg.info.width = tile["width"]
+            msg.info.height = tile["height"]
+            msg.info.origin.position.x = tile["origin_x"]
+            msg.info.origin.position.y = tile["origin_y"]
+            msg.info.origin.orientation.w = 1.0
+            msg.data = tile["data"]
+            self.publish(msg)
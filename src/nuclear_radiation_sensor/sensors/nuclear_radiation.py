@@ -1,8 +1,25 @@
 import logging
 logger = logging.getLogger("morse." + __name__)
 
+import math
+import time
+try:
+    import bpy
+except ImportError:  # not available in the blenderplayer
+    bpy = None
+from mathutils import Vector
+from nuclear_radiation_sensor.tools.attenuation_map import TARGET_PROPERTY, \
+    AttenuationMap
 from nuclear_radiation_sensor.tools.material import MaterialCatalogue
+from nuclear_radiation_sensor.tools.physics import get_transmitted_dose_rates
+from nuclear_radiation_sensor.tools.scene_cache import get_cache_key, \
+    load_scene_data, save_scene_data
+from nuclear_radiation_sensor.tools.tracing import SHIELDING_PROPERTY, \
+    cast_ray, get_path, mark_relevant_objects
+from nuclear_radiation_sensor.tools.trajectory import TrajectoryIntegrator
+from morse.core import blenderapi
 from morse.core.sensor import Sensor
+from morse.core.services import service
 from morse.helpers.components import add_data, add_property
 
 
@@ -13,11 +30,41 @@ class NuclearRadiation(Sensor):
     object it turns it into a radiation source.
     Radiation interacts with matter, therefore shielding properties have to be
     known. This is the reason why all other objects also need a material
-    assigned.
+    assigned, objects without one are treated like the surrounding material
+    and reported by a warning (see tools.tracing.mark_relevant_objects).
     If the shielding properties (half-value layer) is not known it is treated as
     vacuum (no shielding).
     Assigning a material is done through a property named "Material". All
-    available values can be found in the class MaterialCatalogue.
+    available values can be found in the material catalogue files (see
+    MaterialCatalogue), site-specific ones can be added by the environment
+    variable NUCLEAR_RADIATION_MATERIALS (see get_catalogue_paths).
+    Compound sources (e. g. "Spent-Fuel") may consist of many radionuclides of
+    which only a few are relevant. Setting "nuclide_pruning_error" restricts the
+    calculation to the relevant ones (see Compound). The bound applies to the
+    dose rate emitted by a source: shielding changes the mix of radionuclides
+    reaching the sensor, so the error of the measured dose rate may be larger
+    (about twice the bound behind water or concrete). Compounds also shield,
+    both neighbouring sources and themselves (see SelfShielding).
+    With "shielding_filter" set, rays only stop at objects relevant for
+    shielding (sources and objects of attenuating materials), which are marked
+    by the game property "Shielding" when the sources are searched. Objects
+    without a material are then ignored instead of being an error.
+    With "attenuation_maps" set, the shielding around every source is baked
+    into an angular attenuation map (see tools.attenuation_map) at startup,
+    so a moving sensor interpolates its paths instead of tracing them.
+    Positions outside of a map ("attenuation_map_radius") or close to the edges
+    of obstacles are traced as usual, a map is re-baked if its source moves.
+    With "scene_cache" set, the maps baked at startup are stored in an on-disk
+    cache (see tools.scene_cache), so later launches of the same scene with
+    unchanged shielding restore them instead of baking them again.
+
+    The sensor is a thin adapter between MORSE and the physics kernel
+    (tools.physics), which gets the simulation time passed explicitly.
+    Besides measuring at its own position, the sensor offers the service
+    get_dose_rates_at to query the dose rates at a batch of positions, e. g. to
+    score candidate waypoints of a path planner, and the service
+    integrate_dose to get the dose accumulated along a trajectory (see
+    tools.trajectory).
 
     The calculation of the radiation is based on the IAEA's publication
     "Generic procedures for assessment and response during a radiological
@@ -39,14 +86,61 @@ class NuclearRadiation(Sensor):
                   sources every time before calculating radiation")
     add_property("surrounding_material_name", "Air", "surrounding_material_name", "string",
                  "name of the surrounding material (usually 'Air')")
+    add_property("nuclide_pruning_error", 0.0, "nuclide_pruning_error", "float",
+                 "relative error bound of the emitted (unshielded) dose rate \
+                  for pruning the components of compound sources (0 disables \
+                  pruning), shielding may increase the error of the measured \
+                  dose rate")
+    add_property("nuclide_pruning_interval", 3600.0, "nuclide_pruning_interval",
+                 "float", "interval [s] of simulation time after which the \
+                  pruned components of compound sources are re-evaluated")
+    add_property("shielding_filter", True, "shielding_filter", "boolean",
+                 "if set rays ignore objects which are irrelevant for \
+                  shielding, e. g. the robot or objects of transparent \
+                  materials")
+    add_property("scene_cache", True, "scene_cache", "boolean",
+                 "if set the attenuation maps baked at startup are cached on \
+                  disk (keyed by the .blend and material catalogue files and \
+                  the static obstacles)")
+    add_property("attenuation_maps", False, "attenuation_maps", "boolean",
+                 "if set the paths from the sources are interpolated from \
+                  angular attenuation maps baked per source instead of being \
+                  traced (requires static shielding)")
+    add_property("attenuation_map_resolution", 5.0,
+                 "attenuation_map_resolution", "float",
+                 "angular resolution [deg] of the attenuation maps")
+    add_property("attenuation_map_radius", 30.0, "attenuation_map_radius",
+                 "float", "radius [m] covered by the attenuation maps")
+    add_property("attenuation_map_tolerance", 0.05, "attenuation_map_tolerance",
+                 "float", "maximum variation of the thickness of an obstacle \
+                  within an interpolated cell of an attenuation map in HVLs \
+                  of the source's least penetrating radionuclide, otherwise \
+                  the path is traced")
 
     def __init__(self, obj, parent=None):
         logger.info("%s initialization", obj.name)
         Sensor.__init__(self, obj, parent)
 
+        MaterialCatalogue.instance().configure_pruning(
+            self.nuclide_pruning_error, self.nuclide_pruning_interval)
+        # the first sensor defines the time the materials were created at
+        self.get_time()
         self.source_list = self.get_source_list()
+        self.source_terms = None
+        # number of measurements and position of the last one, e. g. for
+        # RadiationMap
+        self.measurements = 0
+        self.measurement_position = None
+        self.maps = {}
         self.surrounding_material = MaterialCatalogue.instance().\
             get_material_by_name(self.surrounding_material_name)
+        if self.attenuation_maps:
+            # baked at startup instead of stalling the first measurement
+            self.bge_object[TARGET_PROPERTY] = True
+            start = time.time()
+            self.bake_attenuation_maps()
+            logger.info("Prepared %d attenuation map(s) in %.1f s",
+                        len(self.maps), time.time() - start)
         logger.info("Component initialized")
 
     def default_action(self):
@@ -59,34 +153,173 @@ class NuclearRadiation(Sensor):
         if self.dynamic_sources:
             self.source_list = self.get_source_list()
 
-        dose_rate = 0
-        effective_dose_rate = 0
-        for source in self.source_list:
-            hit_list = self.cast_ray(source)
-            for radiation in MaterialCatalogue.instance().get_radiation(source, self.bge_object):
-                logger.debug("Overall distance to source: %f", self.bge_object.getDistanceTo(source) * 100.0)
-                logger.debug("Distance inside source object: %f", (
-                    hit_list[0][2] - hit_list[0][0].worldPosition).length * 100.0)
-                for i in range(len(hit_list) - 1):
-                    surrounding_distance = (hit_list[i][2] - hit_list[i + 1][1]).length * 100.0
-                    logger.debug("Distance inside surrounding material: %f" % surrounding_distance)
-                    radiation = self.surrounding_material.get_reduced_radiation(radiation, surrounding_distance)
-                    obj = hit_list[i + 1][0]
-                    if obj is not self.bge_object:
-                        in_object_distance = (hit_list[i + 1][1] - hit_list[i + 1][2]).length * 100.0
-                        material = MaterialCatalogue.instance().get_material_of_object(obj)
-                        radiation = material.get_reduced_radiation(radiation, in_object_distance)
-                        logger.debug("Distance inside %s: %f", material.name, in_object_distance)
-                dose_rate += radiation.dose_rate
-                effective_dose_rate += radiation.effective_dose_rate
+        self.source_terms = self.get_source_terms(self.get_time())
+        dose_rate, effective_dose_rate = self.get_dose_rates(self.bge_object)
         logger.debug("Dose rate: %fmGy/h", dose_rate)
         logger.debug("Effective dose rate: %fmSv/h", effective_dose_rate)
         self.local_data["dose_rate"] = dose_rate
         self.local_data["effective_dose_rate"] = effective_dose_rate
+        self.measurements += 1
+        self.measurement_position = self.bge_object.worldPosition.copy()
+
+    @service
+    def get_dose_rates_at(self, positions):
+        """Returns the dose rate [mGy/h] and effective dose rate [mSv/h] at each
+        of the given world positions [x, y, z] as list of dictionaries with the
+        keys "dose_rate" and "effective_dose_rate". The sources, their emission
+        and decay are shared with the current frame, so only tracing and
+        attenuation are done per position.
+        A position that is no list of three finite numbers or coincides with
+        the origin of a source (where the point kernel diverges) does not fail
+        the batch, its dictionary only has the key "error" describing why.
+        """
+        if self.source_terms is None:
+            self.source_terms = self.get_source_terms(self.get_time())
+        result = []
+        for position in positions:
+            error = self.check_position(position)
+            if error is not None:
+                logger.debug("Skipped position %r: %s", position, error)
+                result.append({"error": error})
+                continue
+            dose_rate, effective_dose_rate = self.get_dose_rates(
+                Vector(position))
+            result.append({"dose_rate": dose_rate,
+                           "effective_dose_rate": effective_dose_rate})
+        return result
+
+    def check_position(self, position):
+        """Returns why the dose rates cannot be calculated at a position given
+        as [x, y, z] or None, if they can (see get_dose_rates_at).
+        """
+        try:
+            if isinstance(position, str):
+                raise TypeError()
+            coordinates = [float(value) for value in position]
+        except (TypeError, ValueError):
+            return "position is no list of numbers"
+        if len(coordinates) != 3:
+            return "position has %d instead of 3 coordinates" % len(
+                coordinates)
+        if not all(math.isfinite(value) for value in coordinates):
+            return "position is not finite"
+        for (source, _) in self.source_terms:
+            if source.getDistanceTo(Vector(coordinates)) == 0.0:
+                return "position is the origin of source %s" % source.name
+        return None
+
+    @service
+    def integrate_dose(self, waypoints, tolerance=1e-3):
+        """Returns the dose [mGy] and effective dose [mSv] accumulated along a
+        trajectory given as list of waypoints [t, x, y, z] (simulation time [s]
+        and world position [m]), moving linearly in between. The result is a
+        dictionary with the keys "dose", "effective_dose", "dose_error" and
+        "effective_dose_error" (heuristic error estimates), "evaluations" and
+        "traced" (see tools.trajectory). The positions are treated as points
+        and the decay of the sources is taken into account; the integration is
+        refined until the relative tolerance is met. The measurement of the
+        current frame is not affected.
+        """
+        catalogue = MaterialCatalogue.instance()
+        waypoints = [[catalogue.get_time(waypoint[0])] + list(waypoint[1:4])
+                     for waypoint in waypoints]
+        maps = None
+        if self.attenuation_maps:
+            maps = dict((source, self.get_attenuation_map(source))
+                        for source in self.source_list)
+        prop = SHIELDING_PROPERTY if self.shielding_filter else ""
+        integrator = TrajectoryIntegrator(
+            self.bge_object, self.source_list, catalogue,
+            self.surrounding_material, prop,
+            self.bge_object, maps)
+        return integrator.integrate(waypoints, tolerance)
+
+    def get_source_terms(self, time):
+        """Returns a list of tuples (source object, emission) for all sources,
+        with the emission being the list of radiation emitted at time [s],
+        measured at a distance of 1 m.
+        """
+        catalogue = MaterialCatalogue.instance()
+        return [(source, catalogue.get_emission(source, time))
+                for source in self.source_list]
+
+    def get_dose_rates(self, target):
+        """Returns the tuple (dose rate, effective dose rate) at the target,
+        which is an object or a point, caused by the current source terms.
+        """
+        dose_rate = 0.0
+        effective_dose_rate = 0.0
+        for (source, emission) in self.source_terms:
+            distance = source.getDistanceTo(target)
+            logger.debug("Overall distance to source: %f", distance * 100.0)
+            path = None
+            if self.attenuation_maps:
+                path = self.get_attenuation_map(source).get_target_path(
+                    self.bge_object, target)
+            if path is None:
+                path = get_path(self.cast_ray(source, target),
+                                MaterialCatalogue.instance(),
+                                self.surrounding_material, self.bge_object)
+            source_dose_rate, source_effective_dose_rate = \
+                get_transmitted_dose_rates(emission, distance, path)
+            dose_rate += source_dose_rate
+            effective_dose_rate += source_effective_dose_rate
+        return dose_rate, effective_dose_rate
+
+    def get_attenuation_map(self, source, data=None):
+        """Returns the attenuation map of a source, which is baked (or restored
+        from data, see AttenuationMap) if it does not exist yet or the source
+        has moved.
+        """
+        attenuation_map = self.maps.get(source)
+        if attenuation_map is None or \
+                attenuation_map.center != source.worldPosition:
+            prop = SHIELDING_PROPERTY if self.shielding_filter else ""
+            attenuation_map = AttenuationMap(
+                self.bge_object, source, MaterialCatalogue.instance(),
+                self.surrounding_material, self.attenuation_map_resolution,
+                self.attenuation_map_radius, self.attenuation_map_tolerance,
+                prop, self.bge_object, data)
+            self.maps[source] = attenuation_map
+        return attenuation_map
+
+    def bake_attenuation_maps(self):
+        """Bakes the attenuation maps of all sources, but restores them from
+        the scene cache if it is enabled and an entry for the scene exists.
+        Otherwise the entry is created.
+        """
+        key = None
+        if self.scene_cache:
+            key = self.get_scene_cache_key()
+        if key is not None:
+            data = load_scene_data(key)
+            if data is not None:
+                try:
+                    for source in self.source_list:
+                        self.get_attenuation_map(source,
+                                                 data["maps"][source.name])
+                    return
+                except (KeyError, TypeError, ValueError):
+                    logger.info("Cached attenuation maps do not match the "
+                                "scene")
+                    self.maps = {}
+        for source in self.source_list:
+            self.get_attenuation_map(source)
+        if key is not None:
+            save_scene_data(key, {"maps": dict(
+                (source.name, self.maps[source].get_data())
+                for source in self.source_list)})
+
+    def get_time(self):
+        """Returns the current time [s] as expected by the physics kernel (see
+        MaterialCatalogue.get_time).
+        """
+        return MaterialCatalogue.instance().get_time(
+            blenderapi.persistantstorage().time.time)
 
     def get_source_list(self):
         """Updates the list of all nuclear radiation sources found in the
-        Simulation scene.
+        Simulation scene and marks the objects relevant for shielding.
         """
         source_list = list()
         for obj in self.bge_object.scene.objects:
@@ -104,35 +337,41 @@ class NuclearRadiation(Sensor):
             except KeyError:
                 pass
         logger.debug("Found %d source(s)", len(source_list))
+        self.relevant_objects = mark_relevant_objects(
+            self.bge_object.scene.objects, MaterialCatalogue.instance(),
+            (self.bge_object,))
         return source_list
 
-    def cast_ray(self, source_object):
-        """Casts a ray from source_object to self and returns a list of all
-        objects in the way. Each entry is a tuple (object, entry_point,
-        exit_point). The source and target themselves are also contained, but in
-        case of the source the entry_point, in case of the target the exit_point
-        is set to None.
+    def get_scene_cache_key(self):
+        """Returns the key of the scene cache (see tools.scene_cache), which
+        covers the .blend file and the libraries it uses, the settings of the
+        attenuation maps and the objects the rays may hit except for this
+        sensor (which the maps ignore), or None if the files are unknown.
+        """
+        if bpy is None or not bpy.data.filepath:
+            return None
+        paths = [bpy.data.filepath]
+        paths.extend(bpy.path.abspath(library.filepath)
+                     for library in bpy.data.libraries)
+        if self.shielding_filter:
+            objects = self.relevant_objects
+        else:
+            objects = self.bge_object.scene.objects
+        settings = {"resolution": self.attenuation_map_resolution,
+                    "radius": self.attenuation_map_radius,
+                    "shielding_filter": self.shielding_filter,
+                    "surrounding_material": self.surrounding_material_name}
+        return get_cache_key(paths, self.bge_object.scene.name,
+                             MaterialCatalogue.instance(), settings,
+                             [obj for obj in objects
+                              if obj is not self.bge_object])
+
+    def cast_ray(self, source_object, target=None):
+        """Casts a ray from source_object to target (an object or a point,
+        defaults to the sensor) and returns a list of all objects in the way
+        (see tools.tracing.cast_ray).
         """
-        hit_objects = list()
-        hit = None
-        source = source_object
-        target = self.bge_object
-        hit_objects.append((source, None, None))
-        while hit != target:
-            hit, entry_point, _ = self.bge_object.rayCast(target, source)
-            if hit is None:  # handle NO_COLLISION sensor
-                hit = target
-                entry_point = target.worldPosition
-            hit_objects.append((hit, entry_point, None))
-            source = entry_point
-
-        # cast a ray in opposite direction to get hit points on the other side
-        for i in reversed(range(len(hit_objects) - 1)):
-            source_point = hit_objects[i + 1][1]
-            target_point = hit_objects[i][1] if i > 0 else hit_objects[0][0].worldPosition
-            _, exit_point, _ = self.bge_object.rayCast(target_point, source_point)
-            if exit_point is None:  # handle NO_COLLISION sensor
-                exit_point = target_point
-            hit_objects[i] = (hit_objects[i][0], hit_objects[i][1],
-                              exit_point)
-        return hit_objects
\ No newline at end of file
+        if target is None:
+            target = self.bge_object
+        prop = SHIELDING_PROPERTY if self.shielding_filter else ""
+        return cast_ray(self.bge_object, source_object, target, prop)
@@ -0,0 +1,99 @@
+import logging
+logger = logging.getLogger("morse." + __name__)
+
+from nuclear_radiation_sensor.tools.voxel_map import SparseVoxelMap, \
+    get_occupancy
+from morse.core import blenderapi
+from morse.core.sensor import Sensor
+from morse.helpers.components import add_data, add_property
+
+
+class RadiationMap(Sensor):
+    """Live radiation map of the area explored by a robot. Every new
+    measurement of a NuclearRadiation sensor, given by its component name, e. g.
+    "robot.radiation", is added to a sparse voxel map (see tools.voxel_map) at
+    the position the sensor measured at. The component checks for new
+    measurements every time it runs, so its frequency should be at least the
+    one of the radiation sensor.
+
+    At the configured publication rate, the tiles of the map changed since the
+    last publication are exported as occupancy-style grids: the mean dose rate
+    of a cell is mapped logarithmically between "min_dose_rate" (0) and
+    "max_dose_rate" (100), unexplored cells are -1.
+    """
+    _name = "RadiationMap"
+    _short_desc = "Map of the dose rates measured along the robot's path."
+
+    # exported data fields
+    add_data("tiles", [], "list",
+             "tiles changed since the last publication, each a dictionary \
+              with origin_x [m], origin_y [m], resolution [m], width, height \
+              and data (occupancy values in row-major order)")
+    add_data("cell_count", 0, "int",
+             "number of visited voxels")
+
+    # configuration properties
+    add_property("radiation_sensor", "", "radiation_sensor", "string",
+                 "component name of the NuclearRadiation sensor")
+    add_property("resolution", 0.5, "resolution", "float",
+                 "edge length [m] of the voxels")
+    add_property("tile_size", 32, "tile_size", "int",
+                 "number of cells per edge of the published tiles")
+    add_property("publish_rate", 1.0, "publish_rate", "float",
+                 "rate [Hz] at which changed tiles are published")
+    add_property("min_dose_rate", 1e-4, "min_dose_rate", "float",
+                 "dose rate [mGy/h] mapped to occupancy 0")
+    add_property("max_dose_rate", 1e2, "max_dose_rate", "float",
+                 "dose rate [mGy/h] mapped to occupancy 100")
+
+    def __init__(self, obj, parent=None):
+        logger.info("%s initialization", obj.name)
+        Sensor.__init__(self, obj, parent)
+
+        self.map = SparseVoxelMap(self.resolution, self.tile_size)
+        # number of measurements of the radiation sensor already added
+        self.measurements = 0
+        self.last_publication = None
+        logger.info("Component initialized")
+
+    def default_action(self):
+        """ Main loop of the mapping component.
+
+        Adds the measurement of the radiation sensor to the map, unless it was
+        added before or the sensor has not measured yet, and exports the
+        changed tiles if the publication is due.
+        """
+        components = blenderapi.persistantstorage().componentDict
+        radiation = components[self.radiation_sensor]
+        if radiation.measurements != self.measurements:
+            self.measurements = radiation.measurements
+            self.map.add_sample(radiation.measurement_position,
+                                radiation.local_data["dose_rate"],
+                                radiation.local_data["effective_dose_rate"])
+            self.local_data["cell_count"] = len(self.map.cells)
+
+        time = blenderapi.persistantstorage().time.time
+        if self.last_publication is None or \
+                time - self.last_publication >= 1.0 / self.publish_rate:
+            self.last_publication = time
+            self.local_data["tiles"] = self.get_changed_tiles()
+        else:
+            self.local_data["tiles"] = []
+
+    def get_changed_tiles(self):
+        """Returns the tiles changed since the last call as exported by the
+        data field "tiles".
+        """
+        tiles = []
+        for tile in self.map.pop_changed_tiles():
+            origin_x, origin_y, values = self.map.get_tile_grid(tile)
+            tiles.append({"origin_x": origin_x,
+                          "origin_y": origin_y,
+                          "resolution": self.resolution,
+                          "width": self.tile_size,
+                          "height": self.tile_size,
+                          "data": [get_occupancy(value, self.min_dose_rate,
+                                                 self.max_dose_rate)
+                                   for value in values]})
+        logger.debug("Publishing %d tile(s)", len(tiles))
+        return tiles
@@ -0,0 +1,305 @@
+"""Angular attenuation maps of nuclear radiation sources in static shielding.
+
+A map is baked once per source: rays are cast from the source along the
+directions of a spherical grid (polar and azimuth angle) out to a maximum
+radius, and the materials along each ray are stored as segments (material,
+start [m], end [m]) measured from the source. The per-material thickness up to
+any radius is the sum of the segments clipped at that radius, so at runtime a
+target's path is interpolated (bilinearly between the four surrounding
+directions) instead of being traced. Interpolating across the edge of an
+obstacle would smear it over a whole grid cell, so if the surrounding directions
+do not pass the same sequence of obstacles or the thickness of an obstacle
+varies by more than a tolerance between them (e. g. rays grazing a wall), the
+path is traced instead. The tolerance is given in HVLs of the obstacle's
+material for the least penetrating radionuclide of the source, so it bounds
+the error of the transmitted dose rate: a variation of n HVLs changes it by a
+factor of at most 2^n. Which distances from the source pass these checks is
+determined per grid cell when the map is created, so targets which have to be
+traced anyway cost no more than a lookup. The result is a path as returned by
+tracing.get_path, so the emission of the source may change (decay, activity)
+without re-baking, as long as the source and the shielding stay in place.
+Baking casts a ray per direction, which is expensive for fine grids, so a map
+can be stored (see get_data) and restored later, e. g. by the scene cache.
+
+Like a traced path, the path to a target object ends at its surface. It is
+found by a single ray cast only hitting objects with the game property
+TARGET_PROPERTY, which therefore has to be set on the target objects.
+"""
+
+import logging
+logger = logging.getLogger("morse." + __name__)
+import math
+
+from nuclear_radiation_sensor.tools.physics import get_smallest_hvl
+from nuclear_radiation_sensor.tools.tracing import cast_ray, \
+    get_obstacle_material
+
+# game property of the objects whose surface ends the interpolated paths, see
+# AttenuationMap.get_target_path()
+TARGET_PROPERTY = "AttenuationMapTarget"
+
+
+class AttenuationMap:
+    """Attenuation map of a single source, see module description."""
+    def __init__(self, caster, source, catalogue, surrounding_material,
+                 resolution=5.0, radius=30.0, tolerance=0.05, prop="",
+                 ignored=None, data=None):
+        """Bakes the map of the source object using the rayCast method of the
+        caster object. The resolution is the angular step [deg] of the grid,
+        radius [m] the extent of the map and tolerance [HVL] the maximum
+        variation of the thickness of an obstacle between the directions
+        interpolated (see module description). prop is passed to cast_ray, the ignored object (usually
+        the sensor) is treated as surrounding material. If data (see
+        get_data) is given, the map is restored from it instead of being baked.
+        """
+        self.source = source
+        self.radius = radius
+        self.tolerance = tolerance
+        vector = type(source.worldPosition)
+        self.center = vector(source.worldPosition)
+        self.theta_count = max(int(round(180.0 / resolution)), 1)
+        self.phi_count = max(int(round(360.0 / resolution)), 2)
+        self.theta_step = math.pi / self.theta_count
+        self.phi_step = 2.0 * math.pi / self.phi_count
+        material = catalogue.get_material_of_object(source)
+        self.self_shielding = material.get_self_shielding()
+        if not self.self_shielding.attenuates:
+            self.self_shielding = None
+        self.radionuclides = material.get_radionuclides()
+        # smallest HVL [cm] of the radionuclides per obstacle material
+        self._hvl = {}
+        # nodes[i][j] is the tuple (chord [cm] through the source, segments,
+        # obstacles) of the direction with polar angle i * theta_step and azimuth angle
+        # j * phi_step
+        if data is not None:
+            self.nodes = self._restore(data, catalogue, surrounding_material)
+            self.limits = self._get_limits()
+            logger.debug("Restored attenuation map of %s", source.name)
+            return
+        self.nodes = []
+        for i in range(self.theta_count + 1):
+            theta = i * self.theta_step
+            row = []
+            for j in range(self.phi_count):
+                phi = j * self.phi_step
+                direction = (math.sin(theta) * math.cos(phi),
+                             math.sin(theta) * math.sin(phi), math.cos(theta))
+                target = vector([self.center[k] + direction[k] * radius
+                                 for k in range(3)])
+                row.append(self._get_node(
+                    cast_ray(caster, source, target, prop), catalogue,
+                    surrounding_material, ignored))
+            self.nodes.append(row)
+        self.limits = self._get_limits()
+        logger.debug("Baked attenuation map of %s (%d directions)",
+                     source.name, (self.theta_count + 1) * self.phi_count)
+
+    def _get_node(self, hit_list, catalogue, surrounding_material, ignored):
+        """Returns the tuple (chord [cm] through the source, segments, obstacles)
+        of a ray given by its hit list (see tracing.cast_ray).
+        """
+        start = (hit_list[0][2] - self.center).length
+        segments = []
+        obstacles = []
+        for (obj, entry_point, exit_point) in hit_list[1:-1]:
+            if obj is ignored:
+                continue
+            obstacles.append(obj)
+            entry = (entry_point - self.center).length
+            segments.append((surrounding_material, start, entry))
+            start = (exit_point - self.center).length
+            segments.append((get_obstacle_material(catalogue, obj,
+                                                   surrounding_material),
+                             entry, start))
+        segments.append((surrounding_material, start, self.radius))
+        return 2.0 * segments[0][1] * 100.0, segments, tuple(obstacles)
+
+    def get_data(self):
+        """Returns the nodes as JSON serializable data: per node its chord, the
+        bounds [m] of its segments and the names of its obstacles, whose
+        materials alternate with the surrounding material along the segments.
+        """
+        return [[[chord, [segments[0][1]] + [stop for (_, _, stop) in segments],
+                  [obj.name for obj in obstacles]]
+                 for (chord, segments, obstacles) in row]
+                for row in self.nodes]
+
+    def _restore(self, data, catalogue, surrounding_material):
+        """Returns the nodes stored by get_data, looking up the obstacles by
+        name in the scene of the source. Raises KeyError or ValueError if the
+        data does not fit the scene or the grid.
+        """
+        objects = dict((obj.name, obj) for obj in self.source.scene.objects)
+        if len(data) != self.theta_count + 1 or \
+                any(len(row) != self.phi_count for row in data):
+            raise ValueError("Grid of the attenuation map data differs")
+        nodes = []
+        for row in data:
+            nodes.append([])
+            for (chord, bounds, names) in row:
+                obstacles = tuple(objects[name] for name in names)
+                materials = [surrounding_material]
+                for obj in obstacles:
+                    materials.append(get_obstacle_material(
+                        catalogue, obj, surrounding_material))
+                    materials.append(surrounding_material)
+                if len(bounds) != len(materials) + 1:
+                    raise ValueError("Segments of the attenuation map data "
+                                     "do not match its obstacles")
+                nodes[-1].append((chord, [(material, bounds[k], bounds[k + 1])
+                                          for (k, material)
+                                          in enumerate(materials)],
+                                  obstacles))
+        return nodes
+
+    def _get_hvl(self, material):
+        """Returns the smallest HVL [cm] of material for the radionuclides of
+        the source or None, if it does not attenuate them.
+        """
+        try:
+            return self._hvl[material]
+        except KeyError:
+            hvl = get_smallest_hvl(material, self.radionuclides)
+            self._hvl[material] = hvl
+            return hvl
+
+    def _get_limits(self):
+        """Returns per grid cell (indexed like its first node) the distance [m]
+        from the source up to which paths are interpolated: the start of the
+        first obstacle which is not passed by all four nodes of the cell or
+        whose thickness varies by more than the tolerance between them.
+        Obstacles entered but not left by a path are checked by get_path.
+        """
+        limits = []
+        for i in range(self.theta_count):
+            row = []
+            for j in range(self.phi_count):
+                nodes = [self.nodes[i][j],
+                         self.nodes[i][(j + 1) % self.phi_count],
+                         self.nodes[i + 1][j],
+                         self.nodes[i + 1][(j + 1) % self.phi_count]]
+                limit = self.radius
+                for k in range(max(len(obstacles)
+                                   for (_, _, obstacles) in nodes)):
+                    segments = [node_segments[2 * k + 1]
+                                for (_, node_segments, obstacles) in nodes
+                                if k < len(obstacles)]
+                    if len(segments) == len(nodes) and \
+                            len(set(obstacles[k] for (_, _, obstacles)
+                                    in nodes)) == 1 and \
+                            self._is_within_tolerance(
+                                segments[0][0], [stop - start for (_, start, stop)
+                                                 in segments]):
+                        continue
+                    limit = min(start for (_, start, _) in segments)
+                    break
+                row.append(limit)
+            limits.append(row)
+        return limits
+
+    def _is_within_tolerance(self, material, thicknesses):
+        """Returns whether the thicknesses [m] of an obstacle of material vary
+        by no more than the tolerance.
+        """
+        hvl = self._get_hvl(material)
+        return hvl is None or \
+            (max(thicknesses) - min(thicknesses)) * 100.0 <= \
+            self.tolerance * hvl
+
+    def _locate(self, position):
+        """Returns the tuple (distance [m], polar angle, azimuth angle) of
+        position relative to the source.
+        """
+        offset = [position[k] - self.center[k] for k in range(3)]
+        distance = math.sqrt(offset[0] ** 2 + offset[1] ** 2 + offset[2] ** 2)
+        if distance == 0.0:
+            return distance, 0.0, 0.0
+        theta = math.acos(max(-1.0, min(1.0, offset[2] / distance)))
+        phi = math.atan2(offset[1], offset[0]) % (2.0 * math.pi)
+        return distance, theta, phi
+
+    def _get_cell(self, theta, phi):
+        """Returns the indices (i, j) of the grid cell containing the direction
+        and the position (t, p) within it.
+        """
+        t = theta / self.theta_step
+        i = min(int(t), self.theta_count - 1)
+        p = phi / self.phi_step
+        j = int(p) % self.phi_count
+        return i, j, t - i, p - int(p)
+
+    def get_target_path(self, caster, target):
+        """Returns the path from the source to target (an object or a point)
+        like get_path. The path to an object ends at its surface, which is hit
+        by a ray cast from the source using the rayCast method of the caster
+        object (see module description). The ray is only cast if the path
+        to the target's origin can be interpolated.
+        """
+        try:
+            position = target.worldPosition
+        except AttributeError:
+            return self.get_path(target)
+        distance, theta, phi = self._locate(position)
+        i, j, _, _ = self._get_cell(theta, phi)
+        if distance == 0.0 or distance > self.limits[i][j]:
+            return None
+        _, entry_point, _ = caster.rayCast(target, self.center, 0,
+                                           TARGET_PROPERTY, 0, 1)
+        if entry_point is None:
+            return self.get_path(position)
+        return self.get_path(position, (entry_point - self.center).length)
+
+    def get_path(self, position, end=None):
+        """Returns the path (list of tuples (material, distance [cm])) from the
+        source towards position [m] up to the distance end [m] from the source
+        (defaults to the distance of position), or None if it is outside of the
+        map (beyond its radius or within the source) or at the edge of an
+        obstacle.
+        """
+        distance, theta, phi = self._locate(position)
+        if distance == 0.0:
+            return None
+        if end is not None:
+            distance = end
+        i, j, t, p = self._get_cell(theta, phi)
+        if distance > self.limits[i][j]:
+            return None  # beyond the edge of an obstacle or the radius
+        neighbours = ((i, j, (1.0 - t) * (1.0 - p)),
+                      (i, (j + 1) % self.phi_count, (1.0 - t) * p),
+                      (i + 1, j, t * (1.0 - p)),
+                      (i + 1, (j + 1) % self.phi_count, t * p))
+
+        chord = 0.0
+        thickness = {}
+        for (node_i, node_j, weight) in neighbours:
+            if weight == 0.0:
+                continue
+            node_chord, segments, _ = self.nodes[node_i][node_j]
+            if distance <= segments[0][1]:
+                return None  # inside of the source
+            chord += weight * node_chord
+            for (material, start, stop) in segments:
+                if start >= distance:
+                    break
+                thickness[material] = thickness.get(material, 0.0) + \
+                    weight * (min(stop, distance) - start) * 100.0
+        # the limit only covers obstacles which are left again, so the one the
+        # path ends in (if any) is checked up to the distance
+        segments_list = [self.nodes[node_i][node_j][1]
+                         for (node_i, node_j, _) in neighbours]
+        for k in range(min(len(self.nodes[node_i][node_j][2])
+                           for (node_i, node_j, _) in neighbours)):
+            segments = [node_segments[2 * k + 1]
+                        for node_segments in segments_list]
+            if all(start >= distance for (_, start, _) in segments):
+                break
+            if any(stop > distance for (_, _, stop) in segments) and \
+                    not self._is_within_tolerance(
+                        segments[0][0],
+                        [max(min(stop, distance) - start, 0.0)
+                         for (_, start, stop) in segments]):
+                return None  # grazing an obstacle
+        path = [] if self.self_shielding is None else \
+            [(self.self_shielding, chord)]
+        path.extend(thickness.items())
+        return path
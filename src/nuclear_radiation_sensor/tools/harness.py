@@ -0,0 +1,522 @@
+"""Accuracy-vs-speed regression harness for the nuclear radiation sensor.
+
+Fixed trajectories are replayed through the exported equivalents of the example
+scenes (see scene and data/scenes). Every evaluation mode, i. e. a set of sensor
+properties enabling approximations, is compared against an exact reference
+evaluator. The result is a single table listing the relative error
+distributions of dose rate and effective dose rate alongside the throughput and
+the ray casts per evaluation. Offline, most of the time is spent casting rays
+(see scene), so the ray casts show the cost of a mode in the BGE better than
+the throughput.
+
+Run from ./src (neither MORSE nor the BGE is needed):
+    python3 -m nuclear_radiation_sensor.tools.harness [--max-error 0.05]
+With --max-error the exit status is non-zero if the 95th percentile of the
+relative error of any mode exceeds the given bound, allowing to gate releases.
+Modes with a stated error bound are checked against it as well (see
+check_bounds), a violation always results in a non-zero exit status.
+With --integrate the trajectories are integrated (see trajectory) instead and
+compared against a converged integration without reuse of paths.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from nuclear_radiation_sensor.tools.attenuation_map import TARGET_PROPERTY, \
+    AttenuationMap
+from nuclear_radiation_sensor.tools.material import MaterialCatalogue
+from nuclear_radiation_sensor.tools.physics import get_transmitted_dose_rates
+from nuclear_radiation_sensor.tools.scene import Scene, Vector
+from nuclear_radiation_sensor.tools.tracing import SHIELDING_PROPERTY, \
+    cast_ray, get_obstacle_material, get_path, mark_relevant_objects
+from nuclear_radiation_sensor.tools.trajectory import TrajectoryIntegrator
+
+SCENE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               os.pardir, os.pardir, os.pardir, "data",
+                               "scenes")
+SCENES = ["simple", "under_water", "short-living_source", "damaged_sfp"]
+
+# the sensor is a cube of this half extents [m] (see builder)
+SENSOR_HALF_EXTENTS = (0.016, 0.028, 0.01)
+
+# sensor properties affecting the evaluation and their default values
+DEFAULT_PROPERTIES = {"nuclide_pruning_error": 0.0,
+                      "nuclide_pruning_interval": 3600.0,
+                      "shielding_filter": True,
+                      "attenuation_maps": False,
+                      "attenuation_map_resolution": 5.0,
+                      "attenuation_map_radius": 30.0,
+                      "attenuation_map_tolerance": 0.05}
+
+# relative tolerance and minimum step [s] of the converged integrations the
+# trajectory integrations are compared against
+REFERENCE_INTEGRATION = (1e-7, 1e-4)
+
+# evaluation modes, each given by the sensor properties deviating from the
+# defaults
+MODES = [("exact", {}),
+         ("pruned-0.1%", {"nuclide_pruning_error": 0.001}),
+         ("pruned-1%", {"nuclide_pruning_error": 0.01}),
+         ("unfiltered", {"shielding_filter": False}),
+         ("attenuation-map", {"attenuation_maps": True})]
+
+
+class ReferenceEvaluator:
+    """Exact reference evaluator. It implements the algorithm of the
+    NuclearRadiation sensor without any approximation, independently of the
+    sensor's tracing. It follows changes of the physics (e. g. the
+    self-shielding of the sources), but not the approximations added to the
+    sensor, which are measured against it.
+    """
+    def __init__(self, scene, sensor):
+        """Initialization setting the offline scene and the sensor object."""
+        self.scene = scene
+        self.sensor = sensor
+        self.catalogue = MaterialCatalogue.instance()
+        self.surrounding_material = self.catalogue.get_material_by_name(
+            scene.surrounding_material)
+        self.source_list = []
+        for obj in scene.objects:
+            if obj is sensor or "Material" not in obj:
+                continue
+            if self.catalogue.get_material_of_object(obj).radioactivity is None:
+                continue
+            if "Volume" not in obj:
+                obj["Volume"] = obj.worldScale[0] * obj.worldScale[1] * \
+                    obj.worldScale[2] * 1e6  # convert to cm^3
+            self.source_list.append(obj)
+
+    def prepare(self):
+        """Prepares the shared material catalogue before replaying a
+        trajectory.
+        """
+        self.catalogue.configure_pruning(0.0, 0.0)
+
+    def evaluate(self, time):
+        """Returns the tuple (dose rate [mGy/h], effective dose rate [mSv/h])
+        at the current position of the sensor at time [s].
+        """
+        dose_rate = 0.0
+        effective_dose_rate = 0.0
+        for source in self.source_list:
+            hit_list = self.cast_ray(source)
+            self_shielding = self.catalogue.get_material_of_object(
+                source).get_self_shielding()
+            chord = 2.0 * (hit_list[0][2] - source.worldPosition).length * 100.0
+            for radiation in self.catalogue.get_radiation(source, self.sensor,
+                                                          time):
+                radiation = self_shielding.get_reduced_radiation(radiation,
+                                                                 chord)
+                for i in range(len(hit_list) - 1):
+                    surrounding_distance = (hit_list[i][2] -
+                                            hit_list[i + 1][1]).length * 100.0
+                    radiation = self.surrounding_material.get_reduced_radiation(
+                        radiation, surrounding_distance)
+                    obj = hit_list[i + 1][0]
+                    if obj is not self.sensor:
+                        in_object_distance = (hit_list[i + 1][1] -
+                                              hit_list[i + 1][2]).length * 100.0
+                        obstacle = get_obstacle_material(
+                            self.catalogue, obj, self.surrounding_material)
+                        radiation = obstacle.get_reduced_radiation(
+                            radiation, in_object_distance)
+                dose_rate += radiation.dose_rate
+                effective_dose_rate += radiation.effective_dose_rate
+        return dose_rate, effective_dose_rate
+
+    def cast_ray(self, source_object):
+        """Returns the list of objects between source_object and the sensor,
+        see NuclearRadiation.cast_ray.
+        """
+        hit_objects = [(source_object, None, None)]
+        hit = None
+        source = source_object
+        target = self.sensor
+        while hit != target:
+            hit, entry_point, _ = target.rayCast(target, source)
+            if hit is None:
+                hit = target
+                entry_point = target.worldPosition
+            hit_objects.append((hit, entry_point, None))
+            source = entry_point
+        for i in reversed(range(len(hit_objects) - 1)):
+            source_point = hit_objects[i + 1][1]
+            target_point = hit_objects[i][1] if i > 0 else \
+                hit_objects[0][0].worldPosition
+            _, exit_point, _ = target.rayCast(target_point, source_point)
+            if exit_point is None:
+                exit_point = target_point
+            hit_objects[i] = (hit_objects[i][0], hit_objects[i][1], exit_point)
+        return hit_objects
+
+
+class SensorModel(ReferenceEvaluator):
+    """Offline twin of the NuclearRadiation sensor. It uses the same tracing and
+    physics as the sensor and applies the sensor properties of an evaluation
+    mode the way the sensor does.
+    """
+    def __init__(self, scene, sensor, properties):
+        ReferenceEvaluator.__init__(self, scene, sensor)
+        self.properties = dict(DEFAULT_PROPERTIES)
+        self.properties.update(properties)
+        self.maps = None
+
+    def prepare(self):
+        self.catalogue.configure_pruning(
+            self.properties["nuclide_pruning_error"],
+            self.properties["nuclide_pruning_interval"])
+        if self.properties["shielding_filter"]:
+            mark_relevant_objects(self.scene.objects, self.catalogue,
+                                  (self.sensor,))
+        if self.properties["attenuation_maps"] and self.maps is None:
+            # baked once like the sensor does at startup, which is not part of
+            # the replayed trajectories
+            prop = SHIELDING_PROPERTY if self.properties["shielding_filter"] \
+                else ""
+            self.sensor[TARGET_PROPERTY] = True
+            self.maps = dict(
+                (source, AttenuationMap(
+                    self.sensor, source, self.catalogue,
+                    self.surrounding_material,
+                    self.properties["attenuation_map_resolution"],
+                    self.properties["attenuation_map_radius"],
+                    self.properties["attenuation_map_tolerance"], prop,
+                    self.sensor))
+                for source in self.source_list)
+
+    def evaluate(self, time):
+        prop = SHIELDING_PROPERTY if self.properties["shielding_filter"] else ""
+        dose_rate = 0.0
+        effective_dose_rate = 0.0
+        for source in self.source_list:
+            emission = self.catalogue.get_emission(source, time)
+            path = None
+            if self.maps is not None:
+                path = self.maps[source].get_target_path(self.sensor,
+                                                         self.sensor)
+            if path is None:
+                path = get_path(cast_ray(self.sensor, source, self.sensor,
+                                         prop),
+                                self.catalogue, self.surrounding_material,
+                                self.sensor)
+            source_dose_rate, source_effective_dose_rate = \
+                get_transmitted_dose_rates(
+                    emission, source.getDistanceTo(self.sensor), path)
+            dose_rate += source_dose_rate
+            effective_dose_rate += source_effective_dose_rate
+        return dose_rate, effective_dose_rate
+
+
+def sample_trajectory(waypoints, samples):
+    """Returns a list of samples (time [s], position) evenly spaced in time
+    along a trajectory given by waypoints (time [s], x, y, z).
+    """
+    start = waypoints[0][0]
+    duration = waypoints[-1][0] - start
+    result = []
+    segment = 0
+    for i in range(samples):
+        t = start + duration * i / max(samples - 1, 1)
+        while segment < len(waypoints) - 2 and t > waypoints[segment + 1][0]:
+            segment += 1
+        (t0, x0, y0, z0) = waypoints[segment]
+        (t1, x1, y1, z1) = waypoints[segment + 1]
+        ratio = (t - t0) / (t1 - t0) if t1 > t0 else 0.0
+        result.append((t, Vector((x0 + (x1 - x0) * ratio,
+                                  y0 + (y1 - y0) * ratio,
+                                  z0 + (z1 - z0) * ratio))))
+    return result
+
+
+def replay(evaluator, samples):
+    """Replays the samples (time, position) using the evaluator and returns the
+    list of results, the elapsed wall-clock time [s] and the number of ray
+    casts.
+    """
+    results = []
+    evaluator.prepare()
+    ray_casts = evaluator.scene.ray_casts
+    start = time.perf_counter()
+    for (t, position) in samples:
+        evaluator.sensor.worldPosition = position
+        results.append(evaluator.evaluate(t))
+    return (results, time.perf_counter() - start,
+            evaluator.scene.ray_casts - ray_casts)
+
+
+def get_relative_errors(results, references):
+    """Returns the relative errors of dose rate and effective dose rate, samples
+    with a reference value of zero are skipped.
+    """
+    errors = ([], [])
+    for (result, reference) in zip(results, references):
+        for i in range(2):
+            if reference[i] > 0.0:
+                errors[i].append(abs(result[i] - reference[i]) / reference[i])
+    return errors
+
+
+def get_percentile(values, percentile):
+    """Returns the percentile (nearest rank) of the values or 0 for an empty
+    list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = int(round(percentile / 100.0 * (len(ordered) - 1)))
+    return ordered[rank]
+
+
+def run(scene_names, modes, samples):
+    """Replays the trajectories of all scenes with all modes and returns the
+    rows of the result table as dictionaries.
+    """
+    rows = []
+    totals = {}
+    for scene_name in scene_names:
+        scene = Scene(os.path.join(SCENE_DIRECTORY, scene_name + ".json"))
+        sensor = scene.add_object("NuclearRadiation", (0.0, 0.0, 0.0),
+                                  SENSOR_HALF_EXTENTS)
+        reference = ReferenceEvaluator(scene, sensor)
+        trajectories = [sample_trajectory(waypoints, samples) for (_, waypoints)
+                        in sorted(scene.trajectories.items())]
+        reference_results = []
+        reference_time = 0.0
+        for trajectory in trajectories:
+            results, elapsed, _ = replay(reference, trajectory)
+            reference_results.extend(results)
+            reference_time += elapsed
+        for (mode_name, properties) in modes:
+            evaluator = SensorModel(scene, sensor, properties)
+            mode_results = []
+            mode_time = 0.0
+            mode_ray_casts = 0
+            for trajectory in trajectories:
+                results, elapsed, ray_casts = replay(evaluator, trajectory)
+                mode_results.extend(results)
+                mode_time += elapsed
+                mode_ray_casts += ray_casts
+            errors = get_relative_errors(mode_results, reference_results)
+            rows.append(_make_row(scene_name, mode_name, len(mode_results),
+                                  mode_time, reference_time, mode_ray_casts,
+                                  errors))
+            total = totals.setdefault(mode_name, [0, 0.0, 0.0, 0, [], []])
+            total[0] += len(mode_results)
+            total[1] += mode_time
+            total[2] += reference_time
+            total[3] += mode_ray_casts
+            total[4].extend(errors[0])
+            total[5].extend(errors[1])
+    for (mode_name, _) in modes:
+        total = totals[mode_name]
+        rows.append(_make_row("all", mode_name, total[0], total[1], total[2],
+                              total[3], (total[4], total[5])))
+    return rows
+
+
+def check_bounds(scene_names, modes, samples):
+    """Checks the error bounds stated by the modes and returns a list of tuples
+    (scene, mode, check, maximum error, bound). With nuclide pruning the
+    relative error of the dose rates emitted by the sources (unshielded, see
+    Compound) is bounded by nuclide_pruning_error.
+    """
+    catalogue = MaterialCatalogue.instance()
+    checks = []
+    for scene_name in scene_names:
+        scene = Scene(os.path.join(SCENE_DIRECTORY, scene_name + ".json"))
+        sensor = scene.add_object("NuclearRadiation", (0.0, 0.0, 0.0),
+                                  SENSOR_HALF_EXTENTS)
+        source_list = ReferenceEvaluator(scene, sensor).source_list
+        times = [[t for (t, _) in sample_trajectory(waypoints, samples)]
+                 for (_, waypoints) in sorted(scene.trajectories.items())]
+        for (mode_name, properties) in modes:
+            relative_error = properties.get("nuclide_pruning_error", 0.0)
+            if relative_error <= 0.0:
+                continue
+            maximum = 0.0
+            for trajectory_times in times:
+                catalogue.configure_pruning(0.0, 0.0)
+                references = [_get_emitted_dose_rates(source_list, t)
+                              for t in trajectory_times]
+                catalogue.configure_pruning(
+                    relative_error,
+                    properties.get("nuclide_pruning_interval",
+                                   DEFAULT_PROPERTIES[
+                                       "nuclide_pruning_interval"]))
+                results = [_get_emitted_dose_rates(source_list, t)
+                           for t in trajectory_times]
+                for values in get_relative_errors(results, references):
+                    maximum = max([maximum] + values)
+            checks.append((scene_name, mode_name, "emitted dose rate", maximum,
+                           relative_error))
+    return checks
+
+
+def _get_emitted_dose_rates(source_list, time):
+    """Returns the tuple (dose rate, effective dose rate) emitted by the sources
+    at time [s], measured at 1 m and unshielded.
+    """
+    catalogue = MaterialCatalogue.instance()
+    dose_rate = 0.0
+    effective_dose_rate = 0.0
+    for source in source_list:
+        for radiation in catalogue.get_emission(source, time):
+            dose_rate += radiation.dose_rate
+            effective_dose_rate += radiation.effective_dose_rate
+    return dose_rate, effective_dose_rate
+
+
+def run_integration(scene_names, tolerance):
+    """Integrates the trajectories of all scenes with the given relative
+    tolerance and returns the rows of the result table as dictionaries.
+    """
+    rows = []
+    for scene_name in scene_names:
+        scene = Scene(os.path.join(SCENE_DIRECTORY, scene_name + ".json"))
+        # the sensor is only the caster of the rays, keep it out of the way
+        sensor = scene.add_object("NuclearRadiation", (1e3, 1e3, 1e3),
+                                  SENSOR_HALF_EXTENTS)
+        model = SensorModel(scene, sensor, {})
+        model.prepare()
+        for (trajectory_name, waypoints) in sorted(scene.trajectories.items()):
+            reference = TrajectoryIntegrator(
+                sensor, model.source_list, model.catalogue,
+                model.surrounding_material, prop=SHIELDING_PROPERTY,
+                ignored=sensor, coherence_length=0.0).integrate(
+                    waypoints, *REFERENCE_INTEGRATION)
+            integrator = TrajectoryIntegrator(
+                sensor, model.source_list, model.catalogue,
+                model.surrounding_material, prop=SHIELDING_PROPERTY,
+                ignored=sensor)
+            start = time.perf_counter()
+            result = integrator.integrate(waypoints, tolerance)
+            elapsed = time.perf_counter() - start
+            row = {"scene": scene_name,
+                   "trajectory": trajectory_name,
+                   "evaluations": result["evaluations"],
+                   "traced": result["traced"],
+                   "elapsed": elapsed}
+            for field in ("dose", "effective_dose"):
+                row[field] = (result[field], result[field + "_error"],
+                              abs(result[field] - reference[field]))
+            rows.append(row)
+    return rows
+
+
+def format_integration_table(rows):
+    """Formats the rows of run_integration as plain text table."""
+    header = ("scene", "trajectory", "evals", "traced", "time [s]",
+              "dose [mGy]", "estimate", "error",
+              "eff. [mSv]", "estimate", "error")
+    lines = [header]
+    for row in rows:
+        lines.append((row["scene"], row["trajectory"],
+                      "%d" % row["evaluations"], "%d" % row["traced"],
+                      "%.3f" % row["elapsed"]) +
+                     tuple("%.2e" % value for value in row["dose"]) +
+                     tuple("%.2e" % value for value in row["effective_dose"]))
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    text = []
+    for (n, line) in enumerate(lines):
+        text.append("  ".join(value.ljust(widths[i]) if i < 2 else
+                              value.rjust(widths[i])
+                              for (i, value) in enumerate(line)))
+        if n == 0:
+            text.append("  ".join("-" * width for width in widths))
+    return "\n".join(text)
+
+
+def _make_row(scene_name, mode_name, evaluations, elapsed, reference_elapsed,
+              ray_casts, errors):
+    """Returns a row of the result table."""
+    row = {"scene": scene_name,
+           "mode": mode_name,
+           "evaluations": evaluations,
+           "throughput": evaluations / elapsed if elapsed > 0.0 else 0.0,
+           "speedup": reference_elapsed / elapsed if elapsed > 0.0 else 0.0,
+           "ray_casts": ray_casts / evaluations if evaluations else 0.0}
+    for (field, values) in zip(("dose_rate", "effective_dose_rate"), errors):
+        row[field] = (get_percentile(values, 50), get_percentile(values, 95),
+                      max(values) if values else 0.0)
+    return row
+
+
+def format_table(rows):
+    """Formats the rows as plain text table."""
+    header = ("scene", "mode", "evals", "evals/s", "casts/eval", "speedup",
+              "dose p50", "dose p95", "dose max",
+              "eff. p50", "eff. p95", "eff. max")
+    lines = [header]
+    for row in rows:
+        lines.append((row["scene"], row["mode"], "%d" % row["evaluations"],
+                      "%.1f" % row["throughput"], "%.1f" % row["ray_casts"],
+                      "%.2f" % row["speedup"]) +
+                     tuple("%.2e" % value for value in row["dose_rate"]) +
+                     tuple("%.2e" % value
+                           for value in row["effective_dose_rate"]))
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    text = []
+    for (n, line) in enumerate(lines):
+        text.append("  ".join(value.ljust(widths[i]) if i < 2 else
+                              value.rjust(widths[i])
+                              for (i, value) in enumerate(line)))
+        if n == 0:
+            text.append("  ".join("-" * width for width in widths))
+    return "\n".join(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compares the evaluation modes of the nuclear radiation "
+                    "sensor against the exact reference.")
+    parser.add_argument("--scenes", nargs="+", default=SCENES,
+                        choices=SCENES, help="scenes to replay")
+    parser.add_argument("--modes", nargs="+",
+                        default=[name for (name, _) in MODES],
+                        choices=[name for (name, _) in MODES],
+                        help="evaluation modes to compare")
+    parser.add_argument("--samples", type=int, default=100,
+                        help="number of samples per trajectory")
+    parser.add_argument("--max-error", type=float, default=None,
+                        help="maximum allowed 95th percentile of the relative "
+                             "error")
+    parser.add_argument("--integrate", type=float, default=None,
+                        metavar="TOLERANCE",
+                        help="integrate the trajectories with the given "
+                             "relative tolerance instead")
+    args = parser.parse_args(argv)
+
+    if args.integrate is not None:
+        print(format_integration_table(run_integration(args.scenes,
+                                                       args.integrate)))
+        return 0
+
+    modes = [(name, properties) for (name, properties) in MODES
+             if name in args.modes]
+    rows = run(args.scenes, modes, args.samples)
+    print(format_table(rows))
+
+    status = 0
+    for (scene_name, mode_name, check, maximum, bound) in check_bounds(
+            args.scenes, modes, args.samples):
+        print("%s: %s/%s: maximum error of the %s %.2e, bound %g" % (
+            "ok" if maximum <= bound else "FAILED", scene_name, mode_name,
+            check, maximum, bound))
+        if maximum > bound:
+            status = 1
+    if args.max_error is not None:
+        failed = [row for row in rows
+                  if row["dose_rate"][1] > args.max_error or
+                  row["effective_dose_rate"][1] > args.max_error]
+        for row in failed:
+            print("FAILED: %s/%s exceeds the maximum error of %g" % (
+                row["scene"], row["mode"], args.max_error))
+        if failed:
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
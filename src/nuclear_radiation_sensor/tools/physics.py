@@ -0,0 +1,622 @@
+"""Physics kernel of the nuclear radiation sensor: decay, activity, point-kernel
+dose and attenuation. It neither depends on MORSE nor on the BGE, the simulation
+time is passed explicitly as time [s] elapsed since the materials were created.
+References:
+[1] "Generic procedures for assessment and response during a radiological
+    emergency" by IAEA, available at:
+    http://www-pub.iaea.org/mtcd/publications/pdf/te_1162_prn.pdf
+"""
+
+import logging
+import math
+logger = logging.getLogger("morse." + __name__)
+
+SECONDS_PER_YEAR = 315576e2
+
+
+def get_decay_factor(half_life, time):
+    """Returns the fraction of a radionuclide with half life [a] left after
+    time [s].
+    """
+    return 0.5 ** (time / (half_life * SECONDS_PER_YEAR))
+
+
+def get_point_kernel_dose(emission, distance):
+    """Returns the radiation received at distance [m] from a point source, which
+    emits the given radiation at a distance of 1 m ("Procedure E1: Point
+    Source" [1, p. 85 et seqq.]).
+    """
+    factor = 1.0 / distance ** 2
+    return Radiation(emission.radionuclide, emission.dose_rate * factor,
+                     emission.effective_dose_rate * factor)
+
+
+def get_attenuation(hvl, distance):
+    """Returns the ratio of radiation transmitted through distance [cm] of a
+    material with given half-value layer [cm].
+    """
+    return 0.5 ** (distance / hvl)
+
+
+def get_transmitted_dose_rates(emission, distance, path):
+    """Returns the tuple (dose rate [mGy/h], effective dose rate [mSv/h])
+    received at distance [m] from a point source emitting the given list of
+    radiation (measured at 1 m, see Material.get_emission). The radiation is
+    reduced along the path, a list of tuples (material, distance [cm]).
+    """
+    dose_rate = 0.0
+    effective_dose_rate = 0.0
+    for radiation in emission:
+        radiation = get_point_kernel_dose(radiation, distance)
+        for (material, material_distance) in path:
+            radiation = material.get_reduced_radiation(radiation,
+                                                       material_distance)
+        dose_rate += radiation.dose_rate
+        effective_dose_rate += radiation.effective_dose_rate
+    return dose_rate, effective_dose_rate
+
+
+def get_smallest_hvl(material, radionuclides):
+    """Returns the smallest HVL [cm] of a material (or SelfShielding) for the
+    radiation of the given radionuclides, i. e. the one of the least
+    penetrating radiation, or None, if it attenuates none of them.
+    """
+    values = [material.get_hvl(radionuclide) for radionuclide in radionuclides]
+    values = [value for value in values if value is not None]
+    return min(values) if values else None
+
+
+def get_mass_attenuation(shielding, radionuclide):
+    """Returns the mass attenuation coefficient [cm^2/g] of a shielding material
+    for the radiation of a radionuclide or None, if it is not known.
+    """
+    if shielding is None or shielding.density is None or \
+            shielding.hvl is None or radionuclide not in shielding.hvl:
+        return None
+    return math.log(2) / (shielding.hvl[radionuclide] * shielding.density)
+
+
+class Material:
+    """This class provides data about the properties and behaviour of some
+    material.
+    """
+    def __init__(self, name, hvl, radioactivity, density=None, shielding=None):
+        """Initialisation setting name, half-value layers, radioactivity,
+        density [g/cm^3] and shielding.
+        The HVL has to be supplied as dictionary with the source radionuclide as
+        key and the corresponding HVL [cm] as value. The density is only needed
+        for shielding materials used by compounds. The shielding is the
+        shielding material describing the attenuation by this material as part
+        of a compound, e. g. the one of its element for a radionuclide.
+        """
+        self.name = name
+        self.hvl = hvl
+        self.radioactivity = radioactivity
+        self.density = density
+        self.shielding = shielding
+        self.attenuates = hvl is not None
+        self._self_shielding = None
+
+    def get_emission(self, volume, time):
+        """Returns the radiation emitted by a point source with volume [cm^3] of
+        this material at time [s], measured at a distance of 1 m and ignoring
+        any shielding effects. None is returned if this material is not
+        radioactive. The result is a list, to allow objects consisting of
+        several radioactive components.
+        """
+        if self.radioactivity is None:
+            return None
+        else:
+            return self.get_emission_of_activity(
+                volume * self.radioactivity.density *
+                self.get_specific_activity(time))
+
+    def get_emission_at(self, volume, time):
+        """Returns the radiation like get_emission, which does not change the
+        state of a material (see Compound.get_emission_at).
+        """
+        return self.get_emission(volume, time)
+
+    def get_emission_of_activity(self, activity):
+        """Returns the radiation emitted by activity [kBq] of this radioactive
+        material (see get_emission).
+        """
+        # formulas based on "Procedure E1: Point Source" [1, p. 85 et seqq.]
+        return [Radiation(self.name,
+                          activity * self.radioactivity.cf_dose_rate,
+                          activity * self.radioactivity.cf_effective_dose_rate)]
+
+    def get_radiation(self, volume, distance, time):
+        """Returns the radiation emitted by a point source with volume [cm^3] of
+        this material at time [s] transmitted to a point at given distance [m],
+        ignoring any shielding effects. None is returned if this material is not
+        radioactive.
+        """
+        emission = self.get_emission(volume, time)
+        if emission is None:
+            return None
+        return [get_point_kernel_dose(radiation, distance)
+                for radiation in emission]
+
+    def get_specific_activity(self, time):
+        """Returns the specific activity [kBq/g] of this material, which has to
+        be radioactive, at time [s].
+        """
+        # formula according to "Activity Calculation" [1, p. 121]
+        return self.radioactivity.initial_specific_activity * \
+            get_decay_factor(self.radioactivity.half_life, time)
+
+    def get_radionuclides(self):
+        """Returns the names of the radionuclides this material consists of."""
+        return [] if self.radioactivity is None else [self.name]
+
+    def get_hvl(self, radionuclide):
+        """Returns the HVL [cm] of this material for the radiation of a
+        radionuclide or None, if it does not attenuate it.
+        """
+        if self.hvl is None:
+            return None
+        return self.hvl[radionuclide]
+
+    def get_reduced_radiation(self, incoming, distance):
+        """Returns the reduced radiation resulting from the incoming radiation
+        travelling distance [cm] through this material.
+        """
+        if self.hvl is None:
+            return incoming
+        else:
+            ratio = get_attenuation(self.hvl[incoming.radionuclide], distance)
+            return Radiation(incoming.radionuclide, incoming.dose_rate * ratio,
+                             incoming.effective_dose_rate * ratio)
+
+    def get_self_shielding(self):
+        """Returns the SelfShielding of sources made of this material."""
+        if self._self_shielding is None:
+            self._self_shielding = SelfShielding(self)
+        return self._self_shielding
+
+
+class SelfShielding:
+    """Attenuation of radiation by the source emitting it. The point source is
+    actually a volume emitting uniformly, so the radiation leaving it along a
+    ray is averaged over the chord of the ray through the source: for the
+    attenuation coefficient mu and chord length L the transmitted ratio is
+    (1 - exp(-mu * L)) / (mu * L). It is used like a material in a path, the
+    distance being the chord length [cm]. Radionuclides have no HVLs of their
+    own, so a source of a pure radionuclide (e. g. 235U) is attenuated by its
+    shielding material (e. g. Uranium).
+    """
+    def __init__(self, material):
+        self.material = material
+        self.name = material.name + " (self-shielding)"
+        if not material.attenuates and \
+                getattr(material, "shielding", None) is not None:
+            self.shielding = material.shielding
+        else:
+            self.shielding = material
+        self.attenuates = self.shielding.attenuates
+
+    def get_hvl(self, radionuclide):
+        """Returns the HVL [cm] of the source for the radiation of a
+        radionuclide or None, if it does not attenuate it.
+        """
+        return self.shielding.get_hvl(radionuclide)
+
+    def get_reduced_radiation(self, incoming, distance):
+        """Returns the radiation leaving the source along a chord of length
+        distance [cm].
+        """
+        hvl = self.get_hvl(incoming.radionuclide)
+        if hvl is None or distance <= 0.0:
+            return incoming
+        optical_thickness = math.log(2) * distance / hvl
+        ratio = -math.expm1(-optical_thickness) / optical_thickness
+        return Radiation(incoming.radionuclide, incoming.dose_rate * ratio,
+                         incoming.effective_dose_rate * ratio)
+
+
+class Radioactivity:
+    """This class combines interesting properties of radioactive isotopes that
+    are needed to estimate the radiation.
+    """
+    def __init__(self, density, mass_number, half_life, cf_dose_rate, cf_effective_dose_rate):
+        """Initialization setting the mass number, half life [a],
+        conversion factors for dose rate [(mGy/h)/kBq] and effective dose rate
+        [(mSv/h)/kBq].
+        """
+        self.density = density
+        self.mass_number = mass_number
+        self.half_life = half_life
+        self.cf_dose_rate = cf_dose_rate
+        self.cf_effective_dose_rate = cf_effective_dose_rate
+
+        # [kBq/s], formula from "Activity Calculation" [1, p. 121 et seq.]
+        self.initial_specific_activity = 1.32e13 / (half_life * mass_number)
+
+
+class Radiation:
+    """This class represents the properties of radiation needed in the
+    simulation.
+    """
+    def __init__(self, radionuclide, dose_rate, effective_dose_rate):
+        """Initializes an instance of Radiation setting the source radionuclide,
+        dose rate [mGy/h], and effective dose rate [mSv/h] and emitting
+        radionuclide.
+        """
+        self.radionuclide = radionuclide
+        self.dose_rate = dose_rate
+        self.effective_dose_rate = effective_dose_rate
+
+
+class DecayChain:
+    """Decay of an inventory of radionuclides including the in-growth of their
+    daughters (Bateman equations). The amounts of the radionuclides evolve by
+    the matrix exponential of the decay matrix. The decay constants, i. e. the
+    eigenvalues of the decay matrix, are distinct, so the matrix exponential is
+    the sum of its eigenprojections weighted by exp(-decay constant * time).
+    The coefficients of this sum are calculated once per chain by the
+    recurrence of the Bateman equations (parents ordered before their
+    daughters), so propagating an inventory over any time costs one
+    exponential per radionuclide and a sparse matrix-vector product. The
+    solution for a given initial inventory (see solve()) is evaluated at any
+    time without propagating step by step.
+    """
+    def __init__(self, materials, branches):
+        """Initialization setting the radioactive materials of the inventory and
+        the branches of decay, a list of tuples (parent index, daughter index,
+        branching ratio) referring to the list of materials.
+        """
+        self.materials = materials
+        self.branches = branches
+        self.decay_constants = [
+            math.log(2) / (material.radioactivity.half_life * SECONDS_PER_YEAR)
+            for material in materials]
+        self._order = self._sort(len(materials), branches)
+        self._coefficients = self._calculate_coefficients()
+
+    @staticmethod
+    def _sort(count, branches):
+        """Returns the indices of the materials ordered parents first."""
+        parents = dict((index, set()) for index in range(count))
+        for (parent, daughter, _) in branches:
+            parents[daughter].add(parent)
+        order = []
+        while parents:
+            roots = sorted(index for (index, pending) in parents.items()
+                           if not pending)
+            if not roots:
+                raise ValueError("Decay branches form a cycle")
+            for index in roots:
+                del parents[index]
+                for pending in parents.values():
+                    pending.discard(index)
+            order.extend(roots)
+        return order
+
+    def _calculate_coefficients(self):
+        """Calculates the coefficients c of the propagator, whose entry (i, j)
+        over time t is the sum of c[i][j][k] * exp(-decay constant k * t): the
+        amount of material i grown from a unit amount of material j. Returns
+        them as list of rows, one per material, each a list of tuples (column
+        index, list of tuples (k, coefficient)) of the non-zero entries.
+        """
+        constants = self.decay_constants
+        parents = dict((index, []) for index in range(len(constants)))
+        for (parent, daughter, ratio) in self.branches:
+            parents[daughter].append((parent, ratio * constants[parent]))
+        # coefficients[j][i] maps k to the coefficient of entry (i, j)
+        coefficients = [{} for _ in constants]
+        for (p, j) in enumerate(self._order):
+            coefficients[j][j] = {j: 1.0}
+            for i in self._order[p + 1:]:
+                terms = {}
+                for (parent, rate) in parents[i]:
+                    for (k, value) in coefficients[j].get(parent, {}).items():
+                        terms[k] = terms.get(k, 0.0) + rate * value
+                if not terms:
+                    continue
+                for k in terms:
+                    if constants[i] == constants[k]:
+                        raise ValueError("Parent and daughter have the same "
+                                         "half life")
+                    terms[k] /= constants[i] - constants[k]
+                # no initial amount of the daughter
+                terms[i] = -sum(terms.values())
+                coefficients[j][i] = terms
+        rows = [[] for _ in constants]
+        for (j, column) in enumerate(coefficients):
+            for (i, terms) in column.items():
+                rows[i].append((j, sorted(terms.items())))
+        return [sorted(row) for row in rows]
+
+    def get_propagator(self, time):
+        """Returns the propagator over time [s] as list of rows, one per
+        material, each a list of tuples (column index, value) of the non-zero
+        entries.
+        """
+        factors = [math.exp(-constant * time)
+                   for constant in self.decay_constants]
+        return [[(column, sum(value * factors[k] for (k, value) in terms))
+                 for (column, terms) in row]
+                for row in self._coefficients]
+
+    def propagate(self, amounts, time):
+        """Returns the amounts [mol] of the materials after time [s]."""
+        return [sum(value * amounts[column] for (column, value) in row)
+                for row in self.get_propagator(time)]
+
+    def solve(self, amounts):
+        """Returns the solution of the Bateman equations for the initial
+        amounts [mol] of the materials, to be evaluated by evaluate().
+        """
+        solution = []
+        for row in self._coefficients:
+            terms = {}
+            for (column, column_terms) in row:
+                for (k, value) in column_terms:
+                    terms[k] = terms.get(k, 0.0) + value * amounts[column]
+            solution.append([(k, value) for (k, value) in sorted(terms.items())
+                             if value != 0.0])
+        return solution
+
+    def evaluate(self, solution, time):
+        """Returns the amounts [mol] of the materials at time [s] given by the
+        solution (see solve()).
+        """
+        factors = [math.exp(-constant * time)
+                   for constant in self.decay_constants]
+        return [sum(value * factors[k] for (k, value) in terms)
+                for terms in solution]
+
+
+class Compound:
+    """This class represents compound radioactive materials.
+
+    The composition of a compound changes by decay, including the in-growth of
+    daughters (see DecayChain): the inventory of all components is evaluated
+    once per time and shared by all sources of the compound.
+
+    Usually only a few components contribute noticeably to the dose rate, e. g.
+    long-living isotopes have a tiny specific activity and short-living ones
+    decay within days. Therefore, a compound can prune its components: only the
+    components needed to stay within a relative error bound of the (unshielded)
+    dose rates are used. The bound does not hold behind shielding, which
+    attenuates the radionuclides differently, e. g. penetrating but pruned
+    ones gain weight. As decay changes the ranking of the components, the
+    set of active components is re-evaluated periodically.
+
+    The attenuation of a compound is derived from its components: the mass
+    attenuation coefficients (per radionuclide) of the components' shielding
+    materials are weighted by the mass fractions, which yields the attenuation
+    coefficient of the compound with its density. Components without a shielding material
+    (usually traces like fission products) are neglected. The resulting HVLs
+    are cached per radionuclide, so a compound shields as cheaply as a plain
+    material.
+    """
+    def __init__(self, name, density, components, branches=None):
+        """Sets the name and density of the compound and its components, which
+        is a list of tuples (component material, initial mass fraction), and the
+        branches of decay (see DecayChain). Daughters not initially contained
+        are components with a mass fraction of 0. Pruning is disabled
+        initially.
+        """
+        self.name = name
+        self.density = density
+        self.components = components
+        self.radioactivity = True
+        self.relative_error = 0.0
+        self.reevaluation_interval = 0.0
+        self.decay_chain = DecayChain([material for (material, _) in components],
+                                      branches or [])
+        # mass fractions over time, from the amounts [mol] per gram of the
+        # compound
+        self._solution = [
+            [(k, value * material.radioactivity.mass_number)
+             for (k, value) in terms]
+            for (terms, (material, _)) in zip(
+                self.decay_chain.solve(
+                    [fraction / material.radioactivity.mass_number
+                     for (material, fraction) in components]),
+                components)]
+        self._t_inventory = None
+        self._inventory = None
+        self._active = list(range(len(components)))
+        self._t_evaluated = None
+        self._active_components = None
+        self._t_active_components = None
+        self._hvl = {}
+        self._self_shielding = None
+        self.attenuates = any(material.shielding is not None and
+                              material.shielding.density is not None
+                              for (material, _) in components)
+
+    def get_inventory(self, time):
+        """Returns the mass fractions of the components at time [s], in the
+        order of the components. The inventory is evaluated from the solution
+        of the Bateman equations, so the times may be requested in any order;
+        the last one is cached.
+        """
+        if time != self._t_inventory:
+            self._inventory = self.get_inventory_at(time)
+            self._t_inventory = time
+        return self._inventory
+
+    def get_inventory_at(self, time):
+        """Returns the mass fractions of the components at time [s] like
+        get_inventory, but without caching them, so the inventory of the
+        current frame is kept.
+        """
+        return self.decay_chain.evaluate(self._solution, time)
+
+    def configure_pruning(self, relative_error, reevaluation_interval):
+        """Sets the relative error bound of the pruning (0 disables it), which
+        bounds the error of the unshielded dose rates (see get_emission), and
+        the interval [s] of simulation time after which the active components
+        are re-evaluated.
+        """
+        self.relative_error = relative_error
+        self.reevaluation_interval = reevaluation_interval
+        self._active = list(range(len(self.components)))
+        self._t_evaluated = None
+        self._t_active_components = None
+
+    def get_active_components(self, time):
+        """Returns the list of tuples (component material, mass fraction at time
+        [s]) needed at time [s] to stay within the relative error bound.
+        """
+        if time == self._t_active_components:
+            return self._active_components
+        inventory = self.get_inventory(time)
+        if self.relative_error > 0.0 and (
+                self._t_evaluated is None or
+                abs(time - self._t_evaluated) >= self.reevaluation_interval):
+            self._active = self._prune(inventory)
+            self._t_evaluated = time
+        self._active_components = [(self.components[index][0],
+                                    inventory[index])
+                                   for index in self._active]
+        self._t_active_components = time
+        return self._active_components
+
+    def get_components_at(self, time):
+        """Returns the list of tuples (component material, mass fraction at time
+        [s]) like get_active_components, but leaves the state of the compound
+        (cached inventory and active components) untouched. The components are
+        pruned for time itself, so times may be requested in any order.
+        """
+        inventory = self.get_inventory_at(time)
+        if self.relative_error > 0.0:
+            active = self._prune(inventory)
+        else:
+            active = range(len(self.components))
+        return [(self.components[index][0], inventory[index])
+                for index in active]
+
+    def _prune(self, inventory):
+        """Ranks the components by their contribution to dose rate and effective
+        dose rate for the given inventory (see get_inventory) and returns the
+        indices of the components left after dropping the weakest ones as long
+        as the dropped share of both stays within the relative error bound.
+        Daughters of the remaining components are kept as well.
+        """
+        contributions = []
+        total_dose_rate = 0.0
+        total_effective_dose_rate = 0.0
+        for (index, (material, _)) in enumerate(self.components):
+            # the mass of the component is proportional to its mass fraction
+            activity = inventory[index] * \
+                material.radioactivity.initial_specific_activity
+            dose_rate = activity * material.radioactivity.cf_dose_rate
+            effective_dose_rate = activity * \
+                material.radioactivity.cf_effective_dose_rate
+            contributions.append((dose_rate, effective_dose_rate, index))
+            total_dose_rate += dose_rate
+            total_effective_dose_rate += effective_dose_rate
+        if total_dose_rate <= 0.0 or total_effective_dose_rate <= 0.0:
+            return list(range(len(self.components)))
+
+        contributions.sort(key=lambda c: max(c[0] / total_dose_rate,
+                                             c[1] / total_effective_dose_rate))
+        dropped_dose_rate = 0.0
+        dropped_effective_dose_rate = 0.0
+        dropped = 0
+        for (dose_rate, effective_dose_rate, _) in contributions:
+            dropped_dose_rate += dose_rate
+            dropped_effective_dose_rate += effective_dose_rate
+            if dropped_dose_rate > self.relative_error * total_dose_rate or \
+                    dropped_effective_dose_rate > \
+                    self.relative_error * total_effective_dose_rate:
+                break
+            dropped += 1
+        active = set(c[2] for c in contributions[dropped:])
+        # daughters grow in until the next re-evaluation, so they are kept with
+        # their parents
+        added = True
+        while added:
+            added = False
+            for (parent, daughter, _) in self.decay_chain.branches:
+                if parent in active and daughter not in active:
+                    active.add(daughter)
+                    added = True
+        active = sorted(active)
+        logger.debug("%s: %d of %d components active", self.name, len(active),
+                     len(self.components))
+        return active
+
+    def get_emission(self, volume, time):
+        """Returns the radiation emitted by a point source with volume [cm^3] of
+        this compound at time [s], measured at a distance of 1 m and ignoring
+        any shielding effects.
+        """
+        return self._get_emission(volume, self.get_active_components(time))
+
+    def get_emission_at(self, volume, time):
+        """Returns the radiation like get_emission, but leaves the state of the
+        compound untouched (see get_components_at), e. g. for times other than
+        the current one.
+        """
+        return self._get_emission(volume, self.get_components_at(time))
+
+    def _get_emission(self, volume, components):
+        """Returns the radiation emitted by a point source with volume [cm^3] of
+        the given components (see get_active_components).
+        """
+        radiation_list = []
+        mass = volume * self.density
+        for (material, fraction) in components:
+            radiation_list.extend(material.get_emission_of_activity(
+                mass * fraction *
+                material.radioactivity.initial_specific_activity))
+        return radiation_list
+
+    def get_radiation(self, volume, distance, time):
+        """Returns the radiation emitted by a point source with volume [cm^3] of
+        this compound at time [s] transmitted to a point at given distance [m],
+        ignoring any shielding effects.
+        """
+        return [get_point_kernel_dose(radiation, distance)
+                for radiation in self.get_emission(volume, time)]
+
+    def get_radionuclides(self):
+        """Returns the names of the radionuclides this compound consists of,
+        including the daughters growing in.
+        """
+        return [material.name for (material, _) in self.components]
+
+    def get_hvl(self, radionuclide):
+        """Returns the HVL [cm] of this compound for the radiation of a
+        radionuclide or None, if none of its components attenuates it.
+        """
+        try:
+            return self._hvl[radionuclide]
+        except KeyError:
+            mass_attenuation = 0.0
+            for (material, fraction) in self.components:
+                component = get_mass_attenuation(material.shielding,
+                                                 radionuclide)
+                if component is not None:
+                    mass_attenuation += fraction * component
+            if mass_attenuation > 0.0:
+                hvl = math.log(2) / (mass_attenuation * self.density)
+            else:
+                hvl = None
+            self._hvl[radionuclide] = hvl
+            return hvl
+
+    def get_reduced_radiation(self, incoming, distance):
+        """Returns the reduced radiation resulting from the incoming radiation
+        travelling distance [cm] through this compound.
+        """
+        hvl = self.get_hvl(incoming.radionuclide)
+        if hvl is None:
+            return incoming
+        ratio = get_attenuation(hvl, distance)
+        return Radiation(incoming.radionuclide, incoming.dose_rate * ratio,
+                         incoming.effective_dose_rate * ratio)
+
+    def get_self_shielding(self):
+        """Returns the SelfShielding of sources made of this compound."""
+        if self._self_shielding is None:
+            self._self_shielding = SelfShielding(self)
+        return self._self_shielding
+
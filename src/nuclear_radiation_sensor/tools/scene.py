@@ -0,0 +1,254 @@
+"""Offline model of a simulation scene, used to evaluate the nuclear radiation
+sensor outside of MORSE (see harness).
+
+A scene is exported from a running simulation by export_scene() and stored as
+JSON file. All objects with a mesh are exported, including the ones without an
+assigned material (see tracing.mark_relevant_objects), they are modelled as
+oriented boxes. The scene objects mimic the parts of the BGE API the sensor
+depends on (rayCast, getDistanceTo, worldPosition, worldScale and the game
+properties), so the sensor's algorithm can be applied unchanged. The scene
+counts the ray casts, which dominate the cost of an evaluation: offline they
+are far slower than in the BGE, so the count is the portable measure of it.
+"""
+
+import json
+import math
+
+# minimum distance [m] of a ray hit from the ray origin, used to skip the
+# surface a ray starts on
+EPSILON = 1e-6
+
+
+class Vector(tuple):
+    """Minimal replacement of mathutils.Vector (three components)."""
+    def __new__(cls, values):
+        return tuple.__new__(cls, (float(values[0]), float(values[1]),
+                                   float(values[2])))
+
+    def __add__(self, other):
+        return Vector((self[0] + other[0], self[1] + other[1],
+                       self[2] + other[2]))
+
+    def __sub__(self, other):
+        return Vector((self[0] - other[0], self[1] - other[1],
+                       self[2] - other[2]))
+
+    def __mul__(self, factor):
+        return Vector((self[0] * factor, self[1] * factor, self[2] * factor))
+
+    __rmul__ = __mul__
+
+    def dot(self, other):
+        return self[0] * other[0] + self[1] * other[1] + self[2] * other[2]
+
+    @property
+    def length(self):
+        return math.sqrt(self.dot(self))
+
+
+class SceneObject:
+    """An oriented box in an offline scene, behaving like a BGE object."""
+    def __init__(self, scene, name, position, orientation, scale, bounds,
+                 properties=None):
+        """Initialization setting the scene, name, world position, world
+        orientation (3x3 rotation matrix, list of rows), world scale, the local
+        bounds of the mesh ((min x, y, z), (max x, y, z)) and the game
+        properties.
+        """
+        self.scene = scene
+        self.name = name
+        self.worldOrientation = [Vector(row) for row in orientation]
+        self.worldScale = Vector(scale)
+        self.bounds = (Vector(bounds[0]), Vector(bounds[1]))
+        self.properties = dict(properties or {})
+        self._half_extents = [abs(self.worldScale[i] *
+                                  (self.bounds[1][i] - self.bounds[0][i]) / 2.0)
+                              for i in range(3)]
+        self.worldPosition = position
+
+    @property
+    def worldPosition(self):
+        return self._position
+
+    @worldPosition.setter
+    def worldPosition(self, position):
+        self._position = Vector(position)
+        # the mesh is not necessarily centred at the object's origin
+        offset = [self.worldScale[i] * (self.bounds[0][i] + self.bounds[1][i]) /
+                  2.0 for i in range(3)]
+        self._center = self._position + self._rotate(offset)
+
+    def __getitem__(self, key):
+        return self.properties[key]
+
+    def __setitem__(self, key, value):
+        self.properties[key] = value
+
+    def __contains__(self, key):
+        return key in self.properties
+
+    def get(self, key, default=None):
+        return self.properties.get(key, default)
+
+    def getDistanceTo(self, other):
+        """Returns the distance [m] to another object or point."""
+        return (_get_position(other) - self.worldPosition).length
+
+    def rayCast(self, objto, objfrom=None, dist=0, prop="", face=0, xray=0,
+                poly=0):
+        """Casts a ray from objfrom (defaults to this object) towards objto and
+        returns the tuple (object, hit point, normal) of the first object
+        entered by the ray or (None, None, None). Like in the BGE, only objects
+        with the property prop are hit if prop is set: with xray, other objects
+        are ignored, otherwise they stop the ray without a hit. The normal is
+        not calculated and always None.
+        """
+        start = self.worldPosition if objfrom is None else \
+            _get_position(objfrom)
+        direction = _get_position(objto) - start
+        length = direction.length
+        if dist:
+            length = abs(dist)
+        if length == 0.0:
+            return None, None, None
+        direction = direction * (1.0 / direction.length)
+
+        self.scene.ray_casts += 1
+        hit = None
+        hit_distance = length
+        for obj in self.scene.objects:
+            if prop and xray and prop not in obj:
+                continue
+            distance = obj._intersect(start, direction)
+            if distance is not None and EPSILON < distance <= hit_distance:
+                hit = obj
+                hit_distance = distance
+        if hit is None or (prop and prop not in hit):
+            return None, None, None
+        return hit, start + direction * hit_distance, None
+
+    def _rotate(self, local):
+        """Rotates a local vector into the world frame."""
+        return Vector([self.worldOrientation[i].dot(local) for i in range(3)])
+
+    def _intersect(self, origin, direction):
+        """Returns the distance along the ray (origin, unit direction) at which
+        the ray enters the box or None, if it does not enter it (this includes
+        rays starting inside).
+        """
+        relative = origin - self._center
+        near = -math.inf
+        far = math.inf
+        for i in range(3):
+            axis = Vector([row[i] for row in self.worldOrientation])
+            o = axis.dot(relative)
+            d = axis.dot(direction)
+            extent = self._half_extents[i]
+            if d == 0.0:
+                if abs(o) > extent:
+                    return None
+                continue
+            t1 = (-extent - o) / d
+            t2 = (extent - o) / d
+            near = max(near, min(t1, t2))
+            far = min(far, max(t1, t2))
+        if near > far or near < 0.0:
+            return None
+        return near
+
+
+class Scene:
+    """Offline scene, loaded from a file written by export_scene()."""
+    def __init__(self, path):
+        with open(path) as scene_file:
+            data = json.load(scene_file)
+        self.name = data["name"]
+        self.environment = data.get("environment")
+        self.surrounding_material = data.get("surrounding_material", "Air")
+        # number of rays cast in this scene
+        self.ray_casts = 0
+        self.objects = []
+        for entry in data["objects"]:
+            properties = {}
+            if entry.get("material") is not None:
+                properties["Material"] = entry["material"]
+            properties.update(entry.get("properties", {}))
+            self.objects.append(SceneObject(
+                self, entry["name"], entry["position"], entry["orientation"],
+                entry["scale"], entry["bounds"], properties))
+        # trajectories are lists of waypoints (time [s], x, y, z), the sensor
+        # moves linearly between them
+        self.trajectories = data.get("trajectories", {})
+
+    def add_object(self, name, position, half_extents, properties=None):
+        """Adds an axis-aligned box, e. g. representing a sensor, and returns
+        it.
+        """
+        obj = SceneObject(self, name, position,
+                          [(1, 0, 0), (0, 1, 0), (0, 0, 1)], half_extents,
+                          ((-1, -1, -1), (1, 1, 1)), properties)
+        self.objects.append(obj)
+        return obj
+
+
+def export_scene(bge_scene, path, name, environment=None,
+                 surrounding_material="Air", trajectories=None):
+    """Exports all objects of a BGE scene with a mesh to a JSON file readable by
+    Scene, the material of objects without an assigned one is null. Meant to be
+    called inside a running simulation, e. g. from the MORSE python console.
+    """
+    objects = []
+    for obj in bge_scene.objects:
+        if not obj.meshes:
+            continue
+        vertices = []
+        for mesh in obj.meshes:
+            for material_index in range(mesh.numMaterials):
+                for index in range(mesh.getVertexArrayLength(material_index)):
+                    vertices.append(mesh.getVertex(material_index,
+                                                   index).getXYZ())
+        properties = {}
+        if "Volume" in obj:
+            properties["Volume"] = obj["Volume"]
+        objects.append({
+            "name": obj.name,
+            "material": obj.get("Material"),
+            "position": list(obj.worldPosition),
+            "orientation": [list(row) for row in obj.worldOrientation],
+            "scale": list(obj.worldScale),
+            "bounds": [[min(v[i] for v in vertices) for i in range(3)],
+                       [max(v[i] for v in vertices) for i in range(3)]],
+            "properties": properties})
+    write_scene(path, {"name": name,
+                       "environment": environment,
+                       "surrounding_material": surrounding_material,
+                       "objects": objects,
+                       "trajectories": trajectories or {}})
+
+
+def write_scene(path, data):
+    """Writes scene data to a JSON file, using one line per object and
+    trajectory to keep the file readable.
+    """
+    lines = ["{"]
+    for key in ("name", "environment", "surrounding_material"):
+        lines.append(" %s: %s," % (json.dumps(key), json.dumps(data[key])))
+    lines.append(' "objects": [')
+    lines.append(",\n".join("  " + json.dumps(obj) for obj in data["objects"]))
+    lines.append(" ],")
+    lines.append(' "trajectories": {')
+    lines.append(",\n".join("  %s: %s" % (json.dumps(name), json.dumps(samples))
+                            for (name, samples)
+                            in sorted(data["trajectories"].items())))
+    lines.append(" }")
+    lines.append("}")
+    with open(path, "w") as scene_file:
+        scene_file.write("\n".join(lines) + "\n")
+
+
+def _get_position(obj):
+    """Returns the world position of an object or the point itself."""
+    try:
+        return obj.worldPosition
+    except AttributeError:
+        return Vector(obj)
@@ -0,0 +1,94 @@
+"""Persistent cache of the static scene data preprocessed by the nuclear
+radiation sensor, i. e. the attenuation maps of the sources (see
+attenuation_map), whose baking dominates the startup. Discovering the sources
+and the materials takes less time than hashing the scene files, so it is not
+cached. An entry is keyed by a hash of the scene files (.blend), the material
+catalogue files, the settings of the cached data and the static obstacle
+metadata: name, material and transformation of every object the rays may hit.
+The hashed files do not cover everything the builder does at startup (e. g.
+transformations or appended environments), the metadata does, so an entry
+becomes stale whenever the shielding changes.
+
+The cache is stored in $XDG_CACHE_HOME/nuclear_radiation_sensor (defaults to
+~/.cache/nuclear_radiation_sensor), one JSON file per entry. It neither
+depends on MORSE nor on the BGE.
+"""
+
+import hashlib
+import json
+import logging
+logger = logging.getLogger("morse." + __name__)
+import os
+
+CACHE_DIRECTORY = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"),
+                                                  ".cache")),
+    "nuclear_radiation_sensor")
+
+# version of the format of the cache entries, part of the key
+FORMAT_VERSION = 3
+
+
+def get_cache_key(scene_paths, scene_name, catalogue, settings, objects):
+    """Returns the key (hex digest) of the cache entry for the scene of the
+    given name described by the given files, the material catalogue, the
+    settings (JSON serializable) and the objects the rays may hit, or None if a
+    scene file cannot be read or the objects are not identified uniquely by
+    their names.
+    """
+    metadata = sorted([obj.name, obj.get("Material"),
+                       list(obj.worldPosition),
+                       [list(row) for row in obj.worldOrientation],
+                       list(obj.worldScale)] for obj in objects)
+    if len(set(entry[0] for entry in metadata)) != len(metadata):
+        logger.warning("Scene cache disabled: object names are not unique")
+        return None
+    digest = hashlib.sha1()
+    digest.update(("%d\0%s\0" % (FORMAT_VERSION, scene_name)).encode("utf-8"))
+    digest.update("\0".join(catalogue.versions).encode("utf-8"))
+    digest.update(json.dumps([settings, metadata],
+                             sort_keys=True).encode("utf-8"))
+    try:
+        for path in list(scene_paths) + list(catalogue.paths):
+            with open(path, "rb") as hashed_file:
+                for chunk in iter(lambda: hashed_file.read(1 << 20), b""):
+                    digest.update(chunk)
+    except (IOError, OSError) as error:
+        logger.warning("Scene cache disabled: %s", error)
+        return None
+    return digest.hexdigest()
+
+
+def load_scene_data(key, directory=CACHE_DIRECTORY):
+    """Returns the cached scene data of the key or None."""
+    path = os.path.join(directory, key + ".json")
+    try:
+        with open(path) as cache_file:
+            data = json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return None
+    if data.get("format") != FORMAT_VERSION:
+        return None
+    logger.info("Loaded scene data from %s", path)
+    return data
+
+
+def save_scene_data(key, data, directory=CACHE_DIRECTORY):
+    """Stores the scene data (a JSON serializable dictionary) for the key.
+    Failures are only logged, as the cache is optional.
+    """
+    path = os.path.join(directory, key + ".json")
+    data = dict(data, format=FORMAT_VERSION)
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # write a temporary file first, so concurrent simulations never read
+        # a partial entry
+        temporary_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(temporary_path, "w") as cache_file:
+            json.dump(data, cache_file)
+        os.replace(temporary_path, path)
+    except (IOError, OSError) as error:
+        logger.warning("Cannot store scene data in %s: %s", path, error)
+        return
+    logger.info("Stored scene data in %s", path)
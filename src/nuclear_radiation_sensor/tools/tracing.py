@@ -0,0 +1,135 @@
+"""Ray tracing between nuclear radiation sources and targets, which are either
+objects or points. Only the rayCast and getDistanceTo methods and the
+worldPosition attribute of the objects are used, so it works on BGE objects as
+well as on offline scene objects (see scene).
+"""
+
+import logging
+logger = logging.getLogger("morse." + __name__)
+
+# game property marking the objects relevant for shielding, see
+# mark_relevant_objects()
+SHIELDING_PROPERTY = "Shielding"
+
+# names of the objects without material that have been warned about, see
+# mark_relevant_objects()
+_unassigned = set()
+
+
+def get_position(target):
+    """Returns the world position of a target object or the target point
+    itself.
+    """
+    try:
+        return target.worldPosition
+    except AttributeError:
+        return target
+
+
+def mark_relevant_objects(objects, catalogue, always=()):
+    """Sets the SHIELDING_PROPERTY of all objects that are relevant for
+    shielding: sources (their exit points are needed) and objects of attenuating
+    materials. The objects given as always (e. g. the sensor, whose surface ends
+    the ray) are marked as well. Returns the list of marked objects.
+    Objects without a material are not relevant, as they are treated like the
+    surrounding material (see get_obstacle_material), a warning is logged once
+    per object.
+    """
+    marked = []
+    for obj in objects:
+        relevant = obj in always
+        if not relevant:
+            try:
+                material = catalogue.get_material_of_object(obj)
+            except KeyError:
+                if obj.name not in _unassigned:
+                    _unassigned.add(obj.name)
+                    logger.warning("No 'Material' set for object %s, it is "
+                                   "treated like the surrounding material",
+                                   obj.name)
+                continue
+            relevant = material.attenuates or material.radioactivity is not None
+        if relevant:
+            obj[SHIELDING_PROPERTY] = True
+            marked.append(obj)
+    logger.debug("%d object(s) relevant for shielding", len(marked))
+    return marked
+
+
+def get_obstacle_material(catalogue, obj, surrounding_material):
+    """Returns the material of an object in the way of a ray or the surrounding
+    material, if it has none assigned (see mark_relevant_objects).
+    """
+    try:
+        return catalogue.get_material_of_object(obj)
+    except KeyError:
+        return surrounding_material
+
+
+def cast_ray(caster, source_object, target, prop=""):
+    """Casts a ray from source_object to target using the rayCast method of the
+    caster object and returns a list of all objects in the way. Each entry is a
+    tuple (object, entry_point, exit_point). The source and target themselves
+    are also contained, but in case of the source the entry_point, in case of
+    the target the exit_point is set to None.
+    If prop is set (usually SHIELDING_PROPERTY), objects without this property
+    are ignored, so the number of ray casts only depends on the relevant
+    objects.
+    """
+    xray = 1 if prop else 0
+    hit_objects = list()
+    hit = None
+    source = source_object
+    target_position = get_position(target)
+    hit_objects.append((source, None, None))
+    while hit is not target:
+        hit, entry_point, _ = caster.rayCast(target, source, 0, prop, 0, xray)
+        if hit is None:  # handle NO_COLLISION sensor and target points
+            hit = target
+            entry_point = target_position
+        hit_objects.append((hit, entry_point, None))
+        source = entry_point
+
+    # cast a ray in opposite direction to get hit points on the other side
+    for i in reversed(range(len(hit_objects) - 1)):
+        source_point = hit_objects[i + 1][1]
+        target_point = hit_objects[i][1] if i > 0 else hit_objects[0][0].worldPosition
+        _, exit_point, _ = caster.rayCast(target_point, source_point, 0, prop,
+                                          0, xray)
+        if exit_point is None:  # handle NO_COLLISION sensor
+            exit_point = target_point
+        hit_objects[i] = (hit_objects[i][0], hit_objects[i][1],
+                          exit_point)
+    return hit_objects
+
+
+def get_path(hit_list, catalogue, surrounding_material, ignored=None):
+    """Returns the path described by a hit list (see cast_ray) as list of tuples
+    (material, distance [cm]), alternating between the surrounding material and
+    the objects in the way. The target and the ignored object (usually the
+    sensor itself) are skipped. If the source attenuates its own radiation, the
+    path starts with its self-shielding (see physics.SelfShielding) along the
+    chord through the source, which is twice the distance from its centre to
+    the exit point. Objects without a material are passed like the surrounding
+    material.
+    """
+    path = []
+    source = hit_list[0][0]
+    material = catalogue.get_material_of_object(source)
+    self_shielding = material.get_self_shielding()
+    if self_shielding.attenuates:
+        chord = 2.0 * (hit_list[0][2] - source.worldPosition).length * 100.0
+        logger.debug("Chord through %s: %f", material.name, chord)
+        path.append((self_shielding, chord))
+    for i in range(len(hit_list) - 1):
+        surrounding_distance = (hit_list[i][2] - hit_list[i + 1][1]).length * 100.0
+        logger.debug("Distance inside surrounding material: %f", surrounding_distance)
+        path.append((surrounding_material, surrounding_distance))
+        obj = hit_list[i + 1][0]
+        if i + 2 < len(hit_list) and obj is not ignored:
+            in_object_distance = (hit_list[i + 1][1] - hit_list[i + 1][2]).length * 100.0
+            material = get_obstacle_material(catalogue, obj,
+                                             surrounding_material)
+            logger.debug("Distance inside %s: %f", material.name, in_object_distance)
+            path.append((material, in_object_distance))
+    return path
@@ -0,0 +1,256 @@
+"""Integration of dose and effective dose along a trajectory, e. g. to review a
+mission or to compare candidate paths of a planner. It neither depends on MORSE
+nor on the BGE (see tracing).
+
+A trajectory is a polyline of waypoints (time [s], x, y, z) along which the
+target moves linearly in time. Every segment is integrated by adaptive Simpson
+quadrature: an interval is bisected until the Simpson estimates of the whole
+interval and of its halves agree within its share of the tolerance, so samples
+concentrate where the dose rate changes, e. g. behind the edges of shielding.
+The difference of both estimates gives the error estimate of the interval
+(Richardson extrapolation), which is summed up over all intervals. Intervals
+whose refinement stops at the minimum step or the maximum depth without meeting
+their tolerance are not extrapolated, their error estimate is the full
+difference. The estimate covers the quadrature only: the error of interpolated
+paths (see below) is not included, so it is a heuristic rather than a bound
+(see harness --integrate for the actual errors).
+
+The emission of the sources is taken at the time of each sample, so decay over
+the trajectory's time span is included. It is evaluated without changing the
+state of the materials (see MaterialCatalogue.get_emission_at), so the samples
+neither disturb the sensor's current frame nor its nuclide pruning.
+
+Tracing dominates the cost of a sample, so each sample is taken once (the
+samples at interior waypoints are shared by both segments) and paths are
+reused when bisecting: if the rays from a source to both ends of an interval
+pass the same sequence of obstacles, the ends are close (coherence_length) and
+the distances in every material differ by no more than thickness_tolerance, the
+path to the midpoint is interpolated instead of traced. The tolerance is given
+in HVLs of the material for the least penetrating radionuclide of the source
+(like attenuation_map), so it is loose for air and strict for dense shielding,
+and relative to the chord for the self-shielding of chords longer than an HVL.
+Reuse only applies to short intervals in uniform shielding, so its benefit
+depends on the scene: harness --integrate traces about a quarter fewer paths on
+the simple scene, but less than a tenth fewer on damaged_sfp, where the rays
+cross the walls of the pool at varying angles. Sources with an attenuation map
+(see attenuation_map) are looked up in the map first.
+"""
+
+import logging
+logger = logging.getLogger("morse." + __name__)
+
+from nuclear_radiation_sensor.tools.physics import SelfShielding, \
+    get_smallest_hvl, get_transmitted_dose_rates
+from nuclear_radiation_sensor.tools.tracing import cast_ray, get_path
+
+# maximum bisection depth of an interval, bounds the number of samples of
+# integrands which do not converge (e. g. discontinuities)
+MAX_DEPTH = 24
+
+
+class TrajectoryIntegrator:
+    """Adaptive integrator of the dose along trajectories, see module
+    description.
+    """
+    def __init__(self, caster, source_list, catalogue, surrounding_material,
+                 prop="", ignored=None, maps=None,
+                 coherence_length=1.0, thickness_tolerance=0.05):
+        """Initialization setting the object whose rayCast method is used, the
+        sources, the material catalogue and the surrounding material. prop
+        and ignored are passed to tracing.cast_ray and tracing.get_path, maps
+        optionally maps sources to their attenuation maps. Paths are reused
+        between samples at most coherence_length [m] apart whose distances in
+        every material differ by no more than thickness_tolerance [HVL] (see
+        module description).
+        """
+        self.caster = caster
+        self.vector = type(caster.worldPosition)
+        self.source_list = source_list
+        self.catalogue = catalogue
+        self.surrounding_material = surrounding_material
+        self.prop = prop
+        self.ignored = ignored
+        self.maps = maps or {}
+        self.coherence_length = coherence_length
+        self.thickness_tolerance = thickness_tolerance
+        self.radionuclides = [
+            catalogue.get_material_of_object(source).get_radionuclides()
+            for source in source_list]
+        # smallest HVL [cm] of the radionuclides per source and material
+        self._hvl = [{} for _ in source_list]
+        self.evaluations = 0
+        self.traced = 0
+
+    def integrate(self, waypoints, tolerance=1e-3, min_step=0.01):
+        """Returns the dose [mGy] and effective dose [mSv] received along the
+        trajectory given by waypoints (time [s], x, y, z) as dictionary with
+        the keys "dose", "effective_dose", "dose_error" and
+        "effective_dose_error" (the error estimates), "evaluations" (number of
+        samples) and "traced" (number of traced paths). The integration stops
+        refining at the relative tolerance or at intervals of min_step [s]. The
+        error estimates do not include the error of interpolated paths (see
+        module description).
+        """
+        self.evaluations = 0
+        self.traced = 0
+        segments = []
+        b = None
+        for (start, end) in zip(waypoints[:-1], waypoints[1:]):
+            if end[0] <= start[0]:
+                continue
+            if b is None or list(start[:4]) != [b[0]] + list(b[1]):
+                a = self._sample(start[0], self.vector(start[1:4]), None, None)
+            else:
+                a = b  # the end of the previous segment
+            b = self._sample(end[0], self.vector(end[1:4]), None, None)
+            m = self._sample_between(a, b)
+            segments.append((a, m, b, _simpson(a, m, b)))
+
+        if not segments:
+            return {"dose": 0.0, "effective_dose": 0.0, "dose_error": 0.0,
+                    "effective_dose_error": 0.0, "evaluations": 0,
+                    "traced": 0}
+
+        # the coarse estimate of the total turns the relative tolerance into
+        # an absolute one, shared by the segments proportionally to their
+        # duration
+        duration = sum(b[0] - a[0] for (a, _, b, _) in segments)
+        eps = [tolerance * abs(sum(whole[i] for (_, _, _, whole) in segments))
+               for i in range(2)]
+        total = [0.0, 0.0]
+        error = [0.0, 0.0]
+        for (a, m, b, whole) in segments:
+            share = (b[0] - a[0]) / duration
+            result, result_error = self._integrate_interval(
+                a, m, b, whole, [value * share for value in eps], min_step, 0)
+            for i in range(2):
+                total[i] += result[i]
+                error[i] += result_error[i]
+        logger.debug("Integrated %d segment(s) with %d sample(s), %d traced "
+                     "path(s)", len(segments), self.evaluations, self.traced)
+        # the integrands are dose rates [mGy/h, mSv/h] over time [s]
+        return {"dose": total[0] / 3600.0,
+                "effective_dose": total[1] / 3600.0,
+                "dose_error": error[0] / 3600.0,
+                "effective_dose_error": error[1] / 3600.0,
+                "evaluations": self.evaluations,
+                "traced": self.traced}
+
+    def _integrate_interval(self, a, m, b, whole, eps, min_step, depth):
+        """Returns the tuples (integral, error estimate) of dose rate and
+        effective dose rate over the interval given by the samples a, m
+        (midpoint) and b, with whole being its Simpson estimate and eps the
+        absolute tolerances.
+        """
+        left_sample = self._sample_between(a, m)
+        right_sample = self._sample_between(m, b)
+        left = _simpson(a, left_sample, m)
+        right = _simpson(m, right_sample, b)
+        delta = [left[i] + right[i] - whole[i] for i in range(2)]
+        if all(abs(delta[i]) <= 15.0 * eps[i] for i in range(2)):
+            return ([left[i] + right[i] + delta[i] / 15.0 for i in range(2)],
+                    [abs(delta[i]) / 15.0 for i in range(2)])
+        if b[0] - a[0] <= min_step or depth >= MAX_DEPTH:
+            # not converged, e. g. at a discontinuity, where the extrapolation
+            # does not hold
+            return ([left[i] + right[i] for i in range(2)],
+                    [abs(delta[i]) for i in range(2)])
+        half = [value / 2.0 for value in eps]
+        left, left_error = self._integrate_interval(
+            a, left_sample, m, left, half, min_step, depth + 1)
+        right, right_error = self._integrate_interval(
+            m, right_sample, b, right, half, min_step, depth + 1)
+        return ([left[i] + right[i] for i in range(2)],
+                [left_error[i] + right_error[i] for i in range(2)])
+
+    def _sample_between(self, a, b):
+        """Returns the sample at the midpoint of the samples a and b."""
+        time = (a[0] + b[0]) / 2.0
+        position = self.vector([(a[1][k] + b[1][k]) / 2.0 for k in range(3)])
+        return self._sample(time, position, a, b)
+
+    def _sample(self, time, position, a, b):
+        """Returns the sample (time, position, dose rates, records) at time [s]
+        and position. records holds the tuple (obstacles, path) per source, the
+        paths of the neighbouring samples a and b (or None) are reused if they
+        are coherent.
+        """
+        self.evaluations += 1
+        dose_rates = [0.0, 0.0]
+        records = []
+        for (n, source) in enumerate(self.source_list):
+            record = None
+            if a is not None and b is not None:
+                record = self._interpolate(n, a[3][n], b[3][n],
+                                           (a[1] - b[1]).length)
+            if record is None:
+                record = self._trace(source, position)
+            records.append(record)
+            emission = self.catalogue.get_emission_at(source, time)
+            source_dose_rates = get_transmitted_dose_rates(
+                emission, source.getDistanceTo(position), record[1])
+            for i in range(2):
+                dose_rates[i] += source_dose_rates[i]
+        return time, position, dose_rates, records
+
+    def _trace(self, source, position):
+        """Returns the record (obstacles, path) of the path from source to
+        position. Paths looked up in an attenuation map have no obstacles
+        (None), so they are never interpolated.
+        """
+        attenuation_map = self.maps.get(source)
+        if attenuation_map is not None:
+            path = attenuation_map.get_path(position)
+            if path is not None:
+                return None, path
+        self.traced += 1
+        hit_list = cast_ray(self.caster, source, position, self.prop)
+        obstacles = tuple(hit[0] for hit in hit_list[1:-1]
+                          if hit[0] is not self.ignored)
+        return obstacles, get_path(hit_list, self.catalogue,
+                                   self.surrounding_material, self.ignored)
+
+    def _interpolate(self, n, a, b, length):
+        """Returns the record of the midpoint between the records a and b of
+        the n-th source, whose samples are length [m] apart, or None if they
+        are not coherent.
+        """
+        if a[0] is None or a[0] != b[0] or length > self.coherence_length or \
+                len(a[1]) != len(b[1]):
+            return None
+        path = []
+        for ((material, a_distance), (_, b_distance)) in zip(a[1], b[1]):
+            hvl = self._get_hvl(n, material)
+            if hvl is None:
+                pass
+            elif isinstance(material, SelfShielding):
+                # beyond an HVL the ratio falls like 1 / chord, so its error
+                # depends on the relative change of the chord
+                scale = max(hvl, min(a_distance, b_distance))
+                if abs(a_distance - b_distance) > \
+                        self.thickness_tolerance * scale:
+                    return None
+            elif abs(a_distance - b_distance) > self.thickness_tolerance * hvl:
+                return None
+            path.append((material, (a_distance + b_distance) / 2.0))
+        return a[0], path
+
+    def _get_hvl(self, n, material):
+        """Returns the smallest HVL [cm] of material for the radionuclides of
+        the n-th source or None, if it attenuates none of them.
+        """
+        try:
+            return self._hvl[n][material]
+        except KeyError:
+            hvl = get_smallest_hvl(material, self.radionuclides[n])
+            self._hvl[n][material] = hvl
+            return hvl
+
+
+def _simpson(a, m, b):
+    """Returns the Simpson estimates of the integrals of dose rate and
+    effective dose rate over the interval given by the samples a, m (midpoint)
+    and b.
+    """
+    return [(b[0] - a[0]) / 6.0 * (a[2][i] + 4.0 * m[2][i] + b[2][i])
+            for i in range(2)]
@@ -0,0 +1,236 @@
+"""Validation of material catalogue files (see MaterialCatalogue.load).
+
+Checks the files as the catalogue would combine them, e. g. whether the HVL
+tables contain all radionuclides, whether compounds only consist of known
+radionuclides, whether the shielding materials of the radionuclides are defined,
+whether the decay branches are consistent and whether all values are physically
+plausible.
+
+Run from ./src:
+    python3 -m nuclear_radiation_sensor.tools.validate_materials [file ...]
+The catalogue files of the simulation (see material.get_catalogue_paths) are
+always checked, site-specific files given as arguments are checked on top of
+them. The exit status is non-zero if errors were found.
+"""
+
+import argparse
+import json
+import sys
+
+from nuclear_radiation_sensor.tools.material import RADIOACTIVITY_COLUMNS, \
+    get_catalogue_paths
+
+
+def validate(paths):
+    """Validates the catalogue files in the order they would be loaded and
+    returns the tuple (errors, warnings), each a list of messages.
+    """
+    errors = []
+    warnings = []
+    radionuclides = {}
+    shielding = {}
+    compounds = {}
+    element_shielding = {}
+    densities = {}
+    half_lives = {}
+    decay = {}
+    for path in paths:
+        try:
+            with open(path) as catalogue_file:
+                table = json.load(catalogue_file)
+        except (IOError, ValueError) as error:
+            errors.append("%s: cannot be read: %s" % (path, error))
+            continue
+        _validate_table(path, table, errors, warnings)
+        nuclides = table.get("nuclides", [])
+        radioactivity = table.get("radioactivity", {})
+        for (row, nuclide) in enumerate(nuclides):
+            values = [_get_value(radioactivity, column, row)
+                      for column in RADIOACTIVITY_COLUMNS]
+            if values[0] is not None:
+                radionuclides[nuclide] = path
+                element_shielding[nuclide] = _get_value(table, "shielding",
+                                                        row)
+                half_lives[nuclide] = values[2]
+        for (name, column) in table.get("hvl", {}).items():
+            hvl = shielding.setdefault(name, {})
+            hvl.update((nuclide, value)
+                       for (nuclide, value) in zip(nuclides, column)
+                       if value is not None)
+        for (name, entry) in table.get("compounds", {}).items():
+            compounds[name] = (path, entry)
+        densities.update(table.get("shielding_density", {}))
+        for branch in table.get("decay", []):
+            if len(branch) != 3:
+                errors.append("%s: decay branch %s is invalid" % (path,
+                                                                 branch))
+                continue
+            decay[(branch[0], branch[1])] = (path, branch[2])
+
+    for name in sorted(set(radionuclides) & set(shielding)):
+        errors.append("%s is defined as radionuclide and shielding material" %
+                      name)
+    for name in sorted(set(compounds) & (set(radionuclides) | set(shielding))):
+        errors.append("%s is defined as compound and as other material" % name)
+
+    for (name, hvl) in sorted(shielding.items()):
+        missing = sorted(set(radionuclides) - set(hvl))
+        if missing:
+            errors.append("HVL table of %s misses: %s" % (name,
+                                                          ", ".join(missing)))
+        unknown = sorted(set(hvl) - set(radionuclides))
+        if unknown:
+            warnings.append("HVL table of %s contains unknown nuclides: %s" %
+                            (name, ", ".join(unknown)))
+
+    for name in sorted(set(densities) - set(shielding)):
+        warnings.append("density of unknown shielding material %s" % name)
+    for (nuclide, name) in sorted(element_shielding.items()):
+        if name is None:
+            continue
+        if name not in shielding:
+            errors.append("shielding material %s of %s is unknown" % (name,
+                                                                     nuclide))
+        elif name not in densities:
+            warnings.append("shielding material %s of %s has no density, "
+                            "compounds are not attenuated by it" % (name,
+                                                                   nuclide))
+
+    _validate_decay(decay, radionuclides, half_lives, errors)
+
+    for (name, (path, entry)) in sorted(compounds.items()):
+        if not entry.get("density", 0) > 0:
+            errors.append("%s: density of compound %s is not positive" %
+                          (path, name))
+        total = 0.0
+        for (component, fraction) in entry.get("components", []):
+            if component not in radionuclides:
+                errors.append("%s: component %s of compound %s is no known "
+                              "radionuclide" % (path, component, name))
+            if not 0.0 < fraction <= 1.0:
+                errors.append("%s: mass fraction of %s in compound %s is out of "
+                              "range" % (path, component, name))
+            total += fraction
+        if total > 1.0 + 1e-6:
+            errors.append("%s: mass fractions of compound %s sum up to %g" %
+                          (path, name, total))
+    return errors, warnings
+
+
+def _validate_table(path, table, errors, warnings):
+    """Checks the structure and the values of a single catalogue file."""
+    nuclides = table.get("nuclides")
+    if not isinstance(nuclides, list):
+        errors.append("%s: list of nuclides is missing" % path)
+        return
+    duplicates = sorted(set(nuclide for nuclide in nuclides
+                            if nuclides.count(nuclide) > 1))
+    if duplicates:
+        errors.append("%s: duplicate nuclides: %s" % (path,
+                                                      ", ".join(duplicates)))
+    if "version" not in table:
+        warnings.append("%s: version is missing" % path)
+
+    radioactivity = table.get("radioactivity", {})
+    for column in sorted(set(radioactivity) - set(RADIOACTIVITY_COLUMNS)):
+        warnings.append("%s: unknown radioactivity column %s" % (path, column))
+    columns = [("radioactivity column " + column, radioactivity.get(column))
+               for column in RADIOACTIVITY_COLUMNS]
+    columns.extend(("HVL column " + name, column)
+                   for (name, column) in sorted(table.get("hvl", {}).items()))
+    if "shielding" in table:
+        columns.append(("shielding column", table["shielding"]))
+    for (description, column) in columns:
+        if column is None:
+            errors.append("%s: %s is missing" % (path, description))
+        elif len(column) != len(nuclides):
+            errors.append("%s: %s has %d instead of %d rows" % (
+                path, description, len(column), len(nuclides)))
+
+    for (name, density) in sorted(table.get("shielding_density", {}).items()):
+        if density is None or not density > 0:
+            errors.append("%s: density of shielding material %s is not "
+                          "positive" % (path, name))
+
+    for (row, nuclide) in enumerate(nuclides):
+        values = [_get_value(radioactivity, column, row)
+                  for column in RADIOACTIVITY_COLUMNS]
+        if values[0] is None:
+            continue
+        for (column, value) in zip(RADIOACTIVITY_COLUMNS, values):
+            if value is None or not value > 0:
+                errors.append("%s: %s of %s is not positive" % (path, column,
+                                                                 nuclide))
+        for (name, column) in sorted(table.get("hvl", {}).items()):
+            value = column[row] if row < len(column) else None
+            if value is not None and not value > 0:
+                errors.append("%s: HVL of %s for %s is not positive" % (
+                    path, name, nuclide))
+
+
+def _validate_decay(decay, radionuclides, half_lives, errors):
+    """Checks the decay branches, given as dictionary (parent, daughter) ->
+    (path, branching ratio), of the combined catalogue files.
+    """
+    totals = {}
+    daughters = {}
+    for ((parent, daughter), (path, ratio)) in sorted(decay.items()):
+        for nuclide in (parent, daughter):
+            if nuclide not in radionuclides:
+                errors.append("%s: %s of decay branch %s -> %s is no known "
+                              "radionuclide" % (path, nuclide, parent,
+                                                daughter))
+        if not isinstance(ratio, (int, float)) or not 0.0 < ratio <= 1.0:
+            errors.append("%s: branching ratio of %s -> %s is out of range" %
+                          (path, parent, daughter))
+            continue
+        if half_lives.get(parent) is not None and \
+                half_lives.get(parent) == half_lives.get(daughter):
+            errors.append("%s: %s and its daughter %s have the same half life" %
+                          (path, parent, daughter))
+        totals[parent] = totals.get(parent, 0.0) + ratio
+        daughters.setdefault(parent, []).append(daughter)
+    for (parent, total) in sorted(totals.items()):
+        if total > 1.0 + 1e-6:
+            errors.append("branching ratios of %s sum up to %g" % (parent,
+                                                                  total))
+    # detect cycles by following the daughters
+    for start in sorted(daughters):
+        pending = list(daughters[start])
+        visited = set()
+        while pending:
+            nuclide = pending.pop()
+            if nuclide == start:
+                errors.append("decay of %s leads back to itself" % start)
+                break
+            if nuclide not in visited:
+                visited.add(nuclide)
+                pending.extend(daughters.get(nuclide, []))
+
+
+def _get_value(table, column, row):
+    """Returns the value of a columnar table or None."""
+    try:
+        return table[column][row]
+    except (KeyError, IndexError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Validates material catalogue files.")
+    parser.add_argument("paths", nargs="*", metavar="file",
+                        help="site-specific catalogue files")
+    args = parser.parse_args(argv)
+
+    errors, warnings = validate(get_catalogue_paths() + args.paths)
+    for message in warnings:
+        print("WARNING: " + message)
+    for message in errors:
+        print("ERROR: " + message)
+    print("%d error(s), %d warning(s)" % (len(errors), len(warnings)))
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Sparse voxel map of dose rates, built incrementally from the samples taken
+while a robot explores a scene (see sensors.radiation_map). It neither depends
+on MORSE nor on the BGE.
+
+Only visited voxels are stored, in a dictionary keyed by their integer grid
+coordinates, so memory grows with the explored area instead of the volume of
+the bounding box. Every voxel keeps running statistics of its samples
+(Welford's algorithm), so adding a sample takes constant time. The map is
+published as two-dimensional tiles of tile_size x tile_size cells, only the
+tiles changed since the last publication are returned by pop_changed_tiles().
+"""
+
+import math
+
+
+def get_occupancy(dose_rate, minimum, maximum):
+    """Returns the occupancy value (0 to 100) of a dose rate on a logarithmic
+    scale between minimum and maximum, or -1 if the dose rate is unknown
+    (None).
+    """
+    if dose_rate is None:
+        return -1
+    if dose_rate <= minimum:
+        return 0
+    if dose_rate >= maximum:
+        return 100
+    return int(round(100.0 * math.log(dose_rate / minimum) /
+                     math.log(maximum / minimum)))
+
+
+class SparseVoxelMap:
+    """Sparse hashed voxel map with running statistics of the dose rates."""
+    def __init__(self, resolution, tile_size=32):
+        """Initialization setting the edge length [m] of the voxels and the
+        number of cells per edge of the published tiles.
+        """
+        self.resolution = resolution
+        self.tile_size = tile_size
+        # voxel -> [count, mean dose rate, sum of squared deviations, mean
+        # effective dose rate]
+        self.cells = {}
+        # tile -> set of its voxels
+        self._tiles = {}
+        self._changed_tiles = set()
+
+    def get_voxel(self, position):
+        """Returns the grid coordinates of the voxel containing position."""
+        return (int(math.floor(position[0] / self.resolution)),
+                int(math.floor(position[1] / self.resolution)),
+                int(math.floor(position[2] / self.resolution)))
+
+    def get_tile(self, voxel):
+        """Returns the coordinates of the tile containing a voxel."""
+        return voxel[0] // self.tile_size, voxel[1] // self.tile_size
+
+    def add_sample(self, position, dose_rate, effective_dose_rate):
+        """Adds the dose rate [mGy/h] and effective dose rate [mSv/h] measured at
+        position [m] to the statistics of its voxel.
+        """
+        voxel = self.get_voxel(position)
+        cell = self.cells.get(voxel)
+        if cell is None:
+            cell = [0, 0.0, 0.0, 0.0]
+            self.cells[voxel] = cell
+            self._tiles.setdefault(self.get_tile(voxel), set()).add(voxel)
+        cell[0] += 1
+        delta = dose_rate - cell[1]
+        cell[1] += delta / cell[0]
+        cell[2] += delta * (dose_rate - cell[1])
+        cell[3] += (effective_dose_rate - cell[3]) / cell[0]
+        self._changed_tiles.add(self.get_tile(voxel))
+
+    def get_statistics(self, position):
+        """Returns the tuple (number of samples, mean dose rate, variance of the
+        dose rate, mean effective dose rate) of the voxel containing position
+        or None, if it was not visited.
+        """
+        cell = self.cells.get(self.get_voxel(position))
+        if cell is None:
+            return None
+        variance = cell[2] / (cell[0] - 1) if cell[0] > 1 else 0.0
+        return cell[0], cell[1], variance, cell[3]
+
+    def pop_changed_tiles(self):
+        """Returns the tiles changed since the last call, sorted."""
+        changed = sorted(self._changed_tiles)
+        self._changed_tiles.clear()
+        return changed
+
+    def get_tile_grid(self, tile):
+        """Returns the tuple (origin x [m], origin y [m], values) of a tile. The
+        values are the mean dose rates of its cells in row-major order
+        (starting at the origin, x varying fastest), projecting the voxels of a
+        column by their maximum. Unvisited cells are None.
+        """
+        values = [None] * (self.tile_size * self.tile_size)
+        x0 = tile[0] * self.tile_size
+        y0 = tile[1] * self.tile_size
+        for voxel in self._tiles.get(tile, ()):
+            index = (voxel[1] - y0) * self.tile_size + voxel[0] - x0
+            mean = self.cells[voxel][1]
+            if values[index] is None or mean > values[index]:
+                values[index] = mean
+        return x0 * self.resolution, y0 * self.resolution, values